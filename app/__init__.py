@@ -1,15 +1,31 @@
 from flask import Flask
 from .config import Config
 from .extensions import db, jwt, cors
+from .json_provider import init_json
 from .routes.auth_routes import auth_bp
 from .routes.file_routes import file_bp
 from .routes.google_drive_routes import google_drive_bp
+from .routes.admin_routes import admin_bp
+from .routes.job_routes import job_bp
 from .services.storage_service import StorageService
+from .services.profiling_service import ProfilingService
+from .services.search_service import SearchService
+from .services.file_index_service import FileIndexService
+from .services.change_journal_service import ChangeJournalService
+from .services.watcher_service import watch_storage_command
+from .services.folder_service import FolderService
+from .services.job_service import JobService
+from .services.version_service import VersionService
+from .services.scrub_service import ScrubService
+from .services.password_service import PasswordService
+from .services.database_service import DatabaseService
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    init_json(app)
 
+    DatabaseService.configure(app)
     db.init_app(app)
     jwt.init_app(app)
     cors.init_app(app, origins=["http://localhost:4200"])
@@ -17,6 +33,18 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(file_bp, url_prefix="/api/files")
     app.register_blueprint(google_drive_bp)
+    app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(job_bp, url_prefix="/api/jobs")
+
+    ProfilingService.init_app(app)
+    SearchService.init_app(app)
+    FileIndexService.init_app(app)
+    ChangeJournalService.init_app(app)
+    VersionService.init_app(app)
+    FolderService.init_app(app)
+    ScrubService.init_app(app)
+    PasswordService.init_app(app)
+    app.cli.add_command(watch_storage_command)
 
     @app.route("/")
     def index():
@@ -24,6 +52,8 @@ def create_app():
     
     # Inicializa o storage ao iniciar a aplicação (cria pastas para todos os usuários)
     with app.app_context():
+        db.create_all()
         StorageService.initialize_storage()
+        JobService.recover_orphans()
 
     return app
@@ -1,4 +1,5 @@
 from .extensions import db
+from .services.password_service import PasswordService
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -13,7 +14,131 @@ class User(db.Model):
     google_refresh_token = db.Column(db.Text)
 
     def set_password(self, password):
-        self.password = password
+        self.password = PasswordService.hash_password(password)
 
     def check_password(self, password):
-        return self.password == password
+        """Confere a senha; regrava o hash se os parâmetros mudaram (o chamador faz o commit)"""
+        ok, upgraded = PasswordService.verify_password(self.password, password)
+        if upgraded:
+            self.password = upgraded
+        return ok
+
+
+class FileEntry(db.Model):
+    """Índice de nomes/caminhos dos arquivos e pastas de cada usuário"""
+    __tablename__ = 'file_entries'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'path', name='uq_file_entries_user_path'),
+        db.Index('ix_file_entries_user_name', 'user_id', 'name_lower'),
+        db.Index('ix_file_entries_user_parent', 'user_id', 'parent'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    path = db.Column(db.String(512), nullable=False)  # relativo à pasta do usuário (POSIX)
+    parent = db.Column(db.String(512), nullable=False, default='')
+    name = db.Column(db.String(255), nullable=False)
+    name_lower = db.Column(db.String(255), nullable=False)
+    extension = db.Column(db.String(32), nullable=False, default='')
+    is_dir = db.Column(db.Boolean, nullable=False, default=False)
+    size = db.Column(db.BigInteger, nullable=False, default=0)  # bytes lógicos (conteúdo original)
+    stored_size = db.Column(db.BigInteger, nullable=False, default=0)  # bytes ocupados em disco
+    encoding = db.Column(db.String(16))  # gzip | zstd | None (sem compressão)
+    modified_at = db.Column(db.DateTime)
+    sha256 = db.Column(db.String(64))  # do conteúdo original, calculado durante o upload
+    verified_at = db.Column(db.DateTime)  # última verificação do scrubber
+    corrupt = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class FileIndexState(db.Model):
+    """Marca os usuários cujo índice de arquivos já foi construído a partir do disco"""
+    __tablename__ = 'file_index_state'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    indexed_at = db.Column(db.DateTime, nullable=False)
+
+
+class ChangeJournalEntry(db.Model):
+    """Journal append-only das mudanças no storage de cada usuário (seq = cursor)"""
+    __tablename__ = 'change_journal'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'seq', name='uq_change_journal_user_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(16), nullable=False)
+    path = db.Column(db.String(512), nullable=False)
+    dest_path = db.Column(db.String(512))
+    is_dir = db.Column(db.Boolean, nullable=False, default=False)
+    size = db.Column(db.BigInteger)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+class ChangeJournalWatermark(db.Model):
+    """Sequência do journal por usuário e último cursor removido pela compactação.
+
+    Cursores anteriores a ``compacted_through`` exigem resync completo.
+    """
+    __tablename__ = 'change_journal_watermarks'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    compacted_through = db.Column(db.Integer, nullable=False, default=0)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    """Operação executada em segundo plano (lotes grandes, operações recursivas)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_user_created', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | running | completed | failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    owner = db.Column(db.String(128))  # "host:pid" do processo que executa o job
+    result = db.Column(db.Text(length=2 ** 24))  # JSON
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class FileVersion(db.Model):
+    """Versão anterior de um arquivo, armazenada como sequência de chunks deduplicados"""
+    __tablename__ = 'file_versions'
+    __table_args__ = (
+        db.Index('ix_file_versions_user_path', 'user_id', 'path'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    path = db.Column(db.String(512), nullable=False)  # relativo à pasta do usuário (POSIX)
+    size = db.Column(db.BigInteger, nullable=False, default=0)  # bytes lógicos
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | stored
+    encoding = db.Column(db.String(16))  # codificação do arquivo pendente (antes do chunking)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+class Chunk(db.Model):
+    """Chunk de conteúdo (SHA-256) no chunk store, com contagem de referências"""
+    __tablename__ = 'chunks'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+
+
+class FileVersionChunk(db.Model):
+    """Posição de cada chunk dentro de uma versão"""
+    __tablename__ = 'file_version_chunks'
+
+    version_id = db.Column(db.Integer, db.ForeignKey('file_versions.id'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    chunk_hash = db.Column(db.String(64), db.ForeignKey('chunks.hash'), nullable=False)
@@ -0,0 +1,55 @@
+from flask import Blueprint, current_app, send_file
+from app.services.admin_service import admin_required
+from app.services.profiling_service import ProfilingService
+from app.services.scrub_service import ScrubService
+from app.services.database_service import DatabaseService
+from app.extensions import db
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.get("/profiles")
+@admin_required
+def list_profiles():
+    """Lista os profiles de requisição mais recentes"""
+    profiles = ProfilingService.list_profiles()
+    return {"success": True, "profiles": profiles, "count": len(profiles)}, 200
+
+
+@admin_bp.get("/profiles/<profile_id>")
+@admin_required
+def get_profile(profile_id):
+    """Retorna métricas (SQL, syscalls, duração) de um profile"""
+    profile = ProfilingService.get_profile(profile_id)
+    if not profile:
+        return {"success": False, "message": "Profile não encontrado"}, 404
+    return {"success": True, "profile": profile}, 200
+
+
+@admin_bp.get("/profiles/<profile_id>/download")
+@admin_required
+def download_profile(profile_id):
+    """Baixa o profile bruto (.folded para flame graph ou .prof do cProfile)"""
+    profile = ProfilingService.get_profile(profile_id)
+    if not profile:
+        return {"success": False, "message": "Profile não encontrado"}, 404
+
+    profile_path = current_app.config['PROFILING_OUTPUT_DIR'] / profile['profile_file']
+    if not profile_path.exists():
+        return {"success": False, "message": "Arquivo de profile não encontrado"}, 404
+    return send_file(str(profile_path), as_attachment=True, download_name=profile['profile_file'])
+
+
+@admin_bp.get("/integrity")
+@admin_required
+def list_corrupt_files():
+    """Arquivos cujo conteúdo não confere com o checksum na última verificação do scrubber"""
+    files = ScrubService.list_corrupt()
+    return {"success": True, "files": files, "count": len(files)}, 200
+
+
+@admin_bp.get("/db-metrics")
+@admin_required
+def database_metrics():
+    """Estado dos pools de conexão (primário e réplicas) e tempo de espera no checkout"""
+    return {"success": True, "engines": DatabaseService.pool_metrics(db.engines)}, 200
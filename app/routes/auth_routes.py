@@ -8,9 +8,18 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.email_service import send_email
 from app.services.auth_register_service import register_user
 from app.services.auth_login_service import authenticate_user
+from app.services.password_service import PasswordHashBusy
+from app.services.database_service import prefer_replica
 
 auth_bp = Blueprint("auth", __name__)
 
+def _busy_response():
+    return {
+        "success": False,
+        "message": "Servidor ocupado, tente novamente em instantes",
+        "error_type": "busy"
+    }, 503, {"Retry-After": "1"}
+
 @auth_bp.post("/register")
 def register():
     
@@ -21,7 +30,10 @@ def register():
     username = data.get("username", "").strip()
     email = data.get("email", "").strip()
     password = data.get("password", "").strip()
-    user, error = register_user(username, email, password)
+    try:
+        user, error = register_user(username, email, password)
+    except PasswordHashBusy:
+        return _busy_response()
 
     if error:
         return {"success": False, "message": error, "error_type": "register_failed"}, 409
@@ -36,7 +48,7 @@ def register():
     }, 201
 
 @auth_bp.post("/login")
-
+@prefer_replica
 def login():
     if not request.json:
         return {
@@ -76,8 +88,11 @@ def login():
             "error_type": "user_not_found"
         }, 404
     
-    senha_ok = user.check_password(password)
-    
+    try:
+        senha_ok = user.check_password(password)
+    except PasswordHashBusy:
+        return _busy_response()
+
     if not senha_ok:
         return {
             "success": False, 
@@ -85,6 +100,9 @@ def login():
             "error_type": "invalid_password"
         }, 401
     
+    if db.session.is_modified(user):
+        db.session.commit()  # hash regravado com os parâmetros atuais
+
     token = create_access_token(identity=str(user.id))
     
     return {
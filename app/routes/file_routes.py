@@ -1,20 +1,67 @@
-from flask import Blueprint, jsonify, request, send_file, current_app
+from flask import Blueprint, jsonify, request, send_file, current_app, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.storage_service import StorageService
+from app.services.storage_service import StorageService, StorageOperationError
+from app.services import storage_events
+from app.services import compression
+from app.services.admission_service import admission_controlled
+from app.services.thumbnail_service import ThumbnailService
+from app.services.search_service import SearchService
+from app.services.file_index_service import FileIndexService
+from app.services.change_journal_service import ChangeJournalService
+from app.services.batch_service import BatchService
+from app.services.folder_service import FolderService
+from app.services.version_service import VersionService
+from app.services.upload_service import UploadService
+from app.services.database_service import prefer_replica
+from app.services.job_service import JobService
 from werkzeug.utils import secure_filename
 import os
+import base64
+import datetime
+import mimetypes
 from pathlib import Path
 
 file_bp = Blueprint("file", __name__)
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NDJSON_BATCH_SIZE = 256  # entradas por bloco enviado
+
+
+def _wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _ndjson_lines(entries):
+    """Serializa as entradas como NDJSON, agrupando linhas para reduzir escritas no socket"""
+    dumps = current_app.json.dumps
+    batch = []
+    for entry in entries:
+        batch.append(dumps(entry))
+        if len(batch) >= NDJSON_BATCH_SIZE:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
 @file_bp.get("/")
 @jwt_required()
+@prefer_replica
 def list_files():
-    """Lista arquivos e pastas do usuário no caminho informado"""
+    """Lista arquivos e pastas do usuário no caminho informado.
+
+    Com ``format=ndjson`` (ou Accept: application/x-ndjson) as entradas saem em
+    streaming, uma por linha e na ordem do disco, sem montar a lista em memória.
+    """
     user_id = get_jwt_identity()
     relative_path = request.args.get('path', '')
 
     try:
+        if _wants_ndjson():
+            entries = StorageService.iter_user_entries(user_id, relative_path)
+            return current_app.response_class(stream_with_context(_ndjson_lines(entries)),
+                                              mimetype=NDJSON_MIMETYPE)
         entries = StorageService.list_user_entries(user_id, relative_path)
     except ValueError:
         return {
@@ -31,6 +78,7 @@ def list_files():
 
 @file_bp.get("/storage-info")
 @jwt_required()
+@prefer_replica
 def storage_info():
     """Retorna informações sobre o storage do usuário"""
     user_id = get_jwt_identity()
@@ -58,8 +106,99 @@ def storage_info():
         }
     }, 200
 
+@file_bp.get("/search")
+@jwt_required()
+def search_files():
+    """Busca full-text no conteúdo dos documentos do usuário"""
+    user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    if not query:
+        return {"success": False, "message": "Parâmetro q é obrigatório"}, 400
+    if not current_app.config.get('SEARCH_ENABLED'):
+        return {"success": False, "message": "Busca desabilitada"}, 503
+
+    results, has_more = SearchService.search(user_id, query, page, per_page)
+    return {
+        "success": True,
+        "items": results,
+        "count": len(results),
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more
+    }, 200
+
+@file_bp.get("/find")
+@jwt_required()
+@prefer_replica
+def find_files():
+    """Busca arquivos/pastas por nome usando o índice (sem varrer o disco)"""
+    user_id = get_jwt_identity()
+    args = request.args
+    mode = args.get('mode', 'prefix')
+    if mode not in ('prefix', 'substring'):
+        return {"success": False, "message": "mode deve ser prefix ou substring"}, 400
+
+    try:
+        modified_after = datetime.datetime.fromisoformat(args['modified_after']) if args.get('modified_after') else None
+        modified_before = datetime.datetime.fromisoformat(args['modified_before']) if args.get('modified_before') else None
+    except ValueError:
+        return {"success": False, "message": "Data inválida (use ISO 8601)"}, 400
+
+    extensions = [e.strip().lower().lstrip('.') for e in args.get('ext', '').split(',') if e.strip()]
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = min(max(args.get('per_page', 50, type=int), 1), 500)
+
+    items, has_more = FileIndexService.search(
+        user_id,
+        query=args.get('q', '').strip(),
+        mode=mode,
+        extensions=extensions,
+        entry_type=args.get('type'),
+        min_size=args.get('min_size', type=int),
+        max_size=args.get('max_size', type=int),
+        modified_after=modified_after,
+        modified_before=modified_before,
+        path=storage_events.to_relative(args.get('path', '')),
+        page=page,
+        per_page=per_page
+    )
+    return {
+        "success": True,
+        "items": items,
+        "count": len(items),
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more
+    }, 200
+
+@file_bp.get("/changes")
+@jwt_required()
+def list_changes():
+    """Retorna as mudanças desde um cursor (delta-sync), com long-poll opcional"""
+    user_id = get_jwt_identity()
+    since = request.args.get('since', type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+    wait = min(max(request.args.get('wait', 0, type=int), 0), current_app.config['JOURNAL_LONGPOLL_MAX_WAIT'])
+
+    if since is None:
+        # Sem cursor: o cliente lista tudo uma vez e sincroniza a partir daqui
+        return {
+            "success": True,
+            "changes": [],
+            "cursor": ChangeJournalService.get_latest_cursor(user_id),
+            "has_more": False,
+            "reset": True
+        }, 200
+
+    result = ChangeJournalService.wait_for_changes(user_id, since, limit, timeout=wait)
+    return {"success": True, **result}, 200
+
 @file_bp.post("/upload")
 @jwt_required()
+@admission_controlled('upload')
 def upload_file():
     """Faz upload de um arquivo"""
     user_id = get_jwt_identity()
@@ -77,6 +216,16 @@ def upload_file():
             "success": False,
             "message": "Nome do arquivo vazio"
         }, 400
+
+    # Com 'path', o upload substitui esse arquivo e o conteúdo anterior vira uma versão
+    replace_path = request.form.get('path')
+    if replace_path:
+        try:
+            result = VersionService.replace_file(file, user_id, replace_path)
+        except StorageOperationError as e:
+            return {"success": False, "message": e.message}, e.status
+        ThumbnailService.schedule(StorageService.get_user_directory(user_id) / result['path'], user_id)
+        return {"success": True, "message": "Nova versão enviada com sucesso", "file": result}, 201
     
     result, error = StorageService.save_file(file, user_id)
     
@@ -85,6 +234,8 @@ def upload_file():
             "success": False,
             "message": error
         }, 400
+
+    ThumbnailService.schedule(StorageService.get_file_path(user_id, result['filename']), user_id)
     
     return {
         "success": True,
@@ -92,8 +243,87 @@ def upload_file():
         "file": result
     }, 201
 
+@file_bp.post("/upload-multiple")
+@jwt_required()
+@admission_controlled('upload')
+def upload_multiple():
+    """Faz upload de vários arquivos (ou de uma pasta) numa única requisição.
+
+    O corpo é lido em streaming, sem passar por request.files: cada arquivo vai
+    para o disco conforme chega e a cota é verificada uma vez, pelo Content-Length.
+    """
+    user_id = get_jwt_identity()
+
+    if request.mimetype != 'multipart/form-data' or not request.mimetype_params.get('boundary'):
+        return {"success": False, "message": "Envie os arquivos como multipart/form-data"}, 400
+    if request.content_length is None:
+        return {"success": False, "message": "Content-Length é obrigatório"}, 411
+
+    try:
+        results, error = UploadService.save_multipart(
+            request.stream, request.mimetype_params['boundary'].encode('latin-1'),
+            user_id, request.content_length
+        )
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
+
+    user_dir = StorageService.get_user_directory(user_id)
+    for result in results:
+        if result['success']:
+            ThumbnailService.schedule(user_dir / result['path'], user_id)
+
+    saved = sum(1 for result in results if result['success'])
+    if error or not results:
+        message, status = error or "Nenhum arquivo enviado", 400
+    elif saved == len(results):
+        message, status = "Arquivos enviados com sucesso", 201
+    else:
+        message, status = f"{saved} de {len(results)} arquivos enviados", 207
+    return {
+        "success": status == 201,
+        "message": message,
+        "saved": saved,
+        "failed": len(results) - saved,
+        "files": results
+    }, status
+
+def _send_stored_file(user_id, file_path, download_name, as_attachment):
+    """Envia um arquivo do storage, respeitando a compressão em repouso.
+
+    Se o cliente aceita a codificação usada em disco, os bytes armazenados vão
+    direto com Content-Encoding; caso contrário a descompressão é feita em streaming.
+    O SHA-256 gravado no upload vira ETag (e Digest, quando o corpo é o original).
+    """
+    entry = StorageService.get_file_entry(user_id, StorageService.to_user_relative(user_id, file_path))
+    checksum = entry.sha256 if entry else None
+    if not entry or not entry.encoding:
+        response = send_file(str(file_path), as_attachment=as_attachment, download_name=download_name,
+                             etag=checksum or True)
+        return _add_digest(response, checksum)
+
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    if request.accept_encodings[entry.encoding]:
+        # Representação diferente (comprimida) => ETag diferente
+        response = send_file(str(file_path), mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, etag=f"{checksum}-{entry.encoding}" if checksum else True)
+        response.headers['Content-Encoding'] = entry.encoding
+    else:
+        response = send_file(compression.open_reader(file_path, entry.encoding), mimetype=mimetype,
+                             as_attachment=as_attachment, download_name=download_name, etag=checksum or False)
+        response.content_length = entry.size
+        _add_digest(response, checksum)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _add_digest(response, checksum):
+    if checksum and response.status_code == 200:
+        response.headers['Digest'] = 'sha-256=' + base64.b64encode(bytes.fromhex(checksum)).decode()
+    return response
+
 @file_bp.get("/download/<filename>")
 @jwt_required()
+@admission_controlled('download')
 def download_file(filename):
     """Faz download de um arquivo"""
     user_id = get_jwt_identity()
@@ -110,15 +340,12 @@ def download_file(filename):
     parts = filename.split('_', 2)
     original_name = parts[2] if len(parts) > 2 else filename
     
-    return send_file(
-        file_path,
-        as_attachment=True,
-        download_name=original_name
-    )
+    return _send_stored_file(user_id, file_path, original_name, as_attachment=True)
 
 
 @file_bp.get('/download-by-path')
 @jwt_required()
+@admission_controlled('download')
 def download_by_path():
     """Faz download informando path relativo e nome"""
     user_id = get_jwt_identity()
@@ -137,13 +364,117 @@ def download_by_path():
     if not file_path.exists():
         return {"success": False, "message": "Arquivo não encontrado"}, 404
 
-    return send_file(str(file_path), as_attachment=False, download_name=name)
+    return _send_stored_file(user_id, file_path, name, as_attachment=False)
+
+@file_bp.get('/versions')
+@jwt_required()
+def list_versions():
+    """Lista as versões anteriores de um arquivo (mais recentes primeiro)"""
+    user_id = get_jwt_identity()
+    relative_path = request.args.get('path')
+    if not relative_path:
+        return {"success": False, "message": "path é obrigatório"}, 400
+
+    versions = VersionService.list_versions(user_id, relative_path)
+    return {"success": True, "versions": versions, "count": len(versions)}, 200
+
+
+@file_bp.get('/versions/<int:version_id>/download')
+@jwt_required()
+@admission_controlled('download')
+def download_version(version_id):
+    """Baixa uma versão anterior, remontada a partir dos chunks em streaming"""
+    user_id = get_jwt_identity()
+    version = VersionService.get_version(user_id, version_id)
+    if not version:
+        return {"success": False, "message": "Versão não encontrada"}, 404
+
+    name = Path(version.path).name
+    response = current_app.response_class(
+        stream_with_context(VersionService.iter_content(version)),
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    )
+    response.content_length = version.size
+    response.headers.set('Content-Disposition', 'attachment', filename=name)
+    return response
+
+
+@file_bp.post('/versions/<int:version_id>/restore')
+@jwt_required()
+def restore_version(version_id):
+    """Restaura uma versão como conteúdo atual (o conteúdo atual vira uma nova versão)"""
+    user_id = get_jwt_identity()
+    try:
+        path = VersionService.restore(user_id, version_id)
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
+    return {"success": True, "message": "Versão restaurada", "path": path}, 200
+
+
+@file_bp.get('/thumbnail')
+@jwt_required()
+def get_thumbnail():
+    """Retorna o thumbnail (ou pré-visualização da 1ª página) de um arquivo.
+
+    A URL é por caminho, então o conteúdo muda quando o arquivo é sobrescrito:
+    sem ``v`` a resposta é revalidada (no-cache + ETag). Com ``v=<hash>`` igual
+    ao hash atual do conteúdo (informado em Content-Location) a URL nunca muda
+    de conteúdo e pode ser marcada como immutable.
+    """
+    user_id = get_jwt_identity()
+    relative_path = request.args.get('path', '')
+    name = request.args.get('name')
+    size = request.args.get('size', 'small')
+    version = request.args.get('v')
+
+    if not name or Path(name).name != name:
+        return {"success": False, "message": "name é obrigatório"}, 400
+    if size not in current_app.config['THUMBNAIL_SIZES']:
+        return {"success": False, "message": "Tamanho de thumbnail inválido"}, 400
+
+    try:
+        base_dir = StorageService.get_user_directory(user_id, relative_path)
+    except ValueError:
+        return {"success": False, "message": "Caminho inválido"}, 400
+
+    file_path = Path(base_dir) / name
+    if not file_path.is_file():
+        return {"success": False, "message": "Arquivo não encontrado"}, 404
+
+    try:
+        thumbnail_path, content_hash = ThumbnailService.get_thumbnail(file_path, size, user_id)
+    except Exception as e:
+        print(f"❌ Erro ao gerar thumbnail: {e}")
+        thumbnail_path = None
+
+    if not thumbnail_path:
+        return {"success": False, "message": "Pré-visualização indisponível para este arquivo"}, 404
+
+    response = send_file(str(thumbnail_path), mimetype='image/jpeg', etag=f"{content_hash}-{size}", conditional=True)
+    if version == content_hash:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Content-Location'] = url_for(
+            'file.get_thumbnail', path=relative_path, name=name, size=size, v=content_hash)
+    return response
+
+def _job_accepted(job, message):
+    return {
+        "success": True,
+        "message": message,
+        "job": JobService.to_dict(job),
+        "status_url": f"/api/jobs/{job.id}"
+    }, 202
 
 @file_bp.delete("/delete/<filename>")
 @jwt_required()
 def delete_file(filename):
-    """Deleta um arquivo"""
+    """Deleta um arquivo (pastas são removidas em segundo plano)"""
     user_id = get_jwt_identity()
+
+    if (StorageService.get_user_directory(user_id) / filename).is_dir():
+        return _delete_folder(user_id, filename)
     
     success, message = StorageService.delete_file(user_id, filename)
     
@@ -159,6 +490,46 @@ def delete_file(filename):
     }, 200
 
 
+def _delete_folder(user_id, relative_path):
+    try:
+        job = FolderService.schedule_delete(user_id, relative_path)
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
+    return _job_accepted(job, "Pasta enviada para a lixeira; remoção em andamento")
+
+
+@file_bp.post('/delete-folder')
+@jwt_required()
+def delete_folder():
+    """Remove uma pasta e todo o conteúdo (job em segundo plano)"""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    relative_path = data.get('path')
+
+    if not relative_path:
+        return {"success": False, "message": "Path é obrigatório"}, 400
+
+    return _delete_folder(user_id, relative_path)
+
+
+@file_bp.post('/move-folder')
+@jwt_required()
+def move_folder():
+    """Move uma pasta e todo o conteúdo (job em segundo plano)"""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    relative_path = data.get('path')
+
+    if not relative_path:
+        return {"success": False, "message": "Path é obrigatório"}, 400
+
+    try:
+        job = FolderService.schedule_move(user_id, relative_path, data.get('target_path', ''))
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
+    return _job_accepted(job, "Movimentação da pasta agendada")
+
+
 @file_bp.post('/mkdir')
 @jwt_required()
 def create_folder():
@@ -171,15 +542,12 @@ def create_folder():
     if not name or not name.strip():
         return {"success": False, "message": "Nome inválido"}, 400
 
-    # sanitize name
-    safe_name = secure_filename(name)
     try:
-        target = str(Path(relative_path) / safe_name)
-        # StorageService.get_user_directory will create the directory
-        StorageService.get_user_directory(user_id, target)
-    except ValueError:
-        return {"success": False, "message": "Caminho inválido"}, 400
+        StorageService.create_folder(user_id, relative_path, name)
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
 
+    target = str(Path(relative_path) / secure_filename(name))
     return {"success": True, "message": "Pasta criada com sucesso", "path": target}, 201
 
 
@@ -195,20 +563,11 @@ def create_file_endpoint():
     if not name or not name.strip():
         return {"success": False, "message": "Nome inválido"}, 400
 
-    safe_name = secure_filename(name)
-    try:
-        dir_path = StorageService.get_user_directory(user_id, relative_path)
-    except ValueError:
-        return {"success": False, "message": "Caminho inválido"}, 400
-
-    file_path = Path(dir_path) / safe_name
-    if file_path.exists():
-        return {"success": False, "message": "Arquivo já existe"}, 400
-
     try:
-        # create empty file
-        file_path.touch()
-        return {"success": True, "message": "Arquivo criado", "filename": safe_name}, 201
+        created = StorageService.create_empty_file(user_id, relative_path, name)
+        return {"success": True, "message": "Arquivo criado", "filename": Path(created).name}, 201
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
     except Exception as e:
         return {"success": False, "message": f"Erro ao criar arquivo: {str(e)}"}, 500
 
@@ -225,22 +584,64 @@ def move_file():
     if not filename:
         return {"success": False, "message": "Filename é obrigatório"}, 400
 
-    # source path
-    src = StorageService.get_file_path(user_id, filename)
-    if not src:
-        return {"success": False, "message": "Arquivo não encontrado"}, 404
-
     try:
-        dest_dir = StorageService.get_user_directory(user_id, target_path)
-    except ValueError:
-        return {"success": False, "message": "Caminho de destino inválido"}, 400
+        if (StorageService.get_user_directory(user_id) / filename).is_dir():
+            return _job_accepted(FolderService.schedule_move(user_id, filename, target_path),
+                                 "Movimentação da pasta agendada")
+        StorageService.move_file(user_id, filename, target_path)
+        return {"success": True, "message": "Arquivo movido"}, 200
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
+    except Exception as e:
+        return {"success": False, "message": f"Erro ao mover arquivo: {str(e)}"}, 500
 
-    dest = Path(dest_dir) / filename
-    if dest.exists():
-        return {"success": False, "message": "Arquivo de destino já existe"}, 400
+
+@file_bp.post('/copy')
+@jwt_required()
+def copy_path():
+    """Copia um arquivo ou pasta no servidor (pastas são copiadas em segundo plano)"""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    relative_path = data.get('path')
+    target_path = data.get('target_path', '')
+    new_name = data.get('name')
+
+    if not relative_path:
+        return {"success": False, "message": "Path é obrigatório"}, 400
 
     try:
-        src.replace(dest)
-        return {"success": True, "message": "Arquivo movido"}, 200
+        if (StorageService.get_user_directory(user_id) / relative_path).is_dir():
+            return _job_accepted(FolderService.schedule_copy(user_id, relative_path, target_path, new_name=new_name),
+                                 "Cópia da pasta agendada")
+        copied = StorageService.copy_file(user_id, relative_path, target_path, new_name=new_name)
+        return {"success": True, "message": "Arquivo copiado", "path": copied}, 201
+    except StorageOperationError as e:
+        return {"success": False, "message": e.message}, e.status
     except Exception as e:
-        return {"success": False, "message": f"Erro ao mover arquivo: {str(e)}"}, 500
+        return {"success": False, "message": f"Erro ao copiar: {str(e)}"}, 500
+
+
+@file_bp.post('/batch')
+@jwt_required()
+def batch_operations():
+    """Executa várias operações (mkdir, create, copy, move, delete) em uma requisição.
+
+    Lotes com ``background: true`` ou acima de BATCH_SYNC_MAX_OPERATIONS viram
+    um job; o progresso fica em GET /api/jobs/<id>.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    operations = data.get('operations')
+
+    if not isinstance(operations, list) or not operations:
+        return {"success": False, "message": "Informe a lista de operações"}, 400
+
+    max_operations = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > max_operations:
+        return {"success": False, "message": f"Máximo de {max_operations} operações por lote"}, 400
+
+    if data.get('background') or len(operations) > current_app.config['BATCH_SYNC_MAX_OPERATIONS']:
+        return _job_accepted(BatchService.submit_job(user_id, operations), "Lote agendado")
+
+    summary = BatchService.summarize(BatchService.execute(user_id, operations))
+    return {"success": summary['failed'] == 0, **summary}, 200
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from ..models import User
+from app.services.database_service import prefer_replica
 import os
 
 google_drive_bp = Blueprint('google_drive', __name__, url_prefix='/api/google-drive')
@@ -24,6 +25,7 @@ def get_drive_service(user):
 
 @google_drive_bp.get('/files')
 @jwt_required()
+@prefer_replica
 def list_files():
     """Lista arquivos do Google Drive do usuário autenticado."""
     try:
@@ -93,6 +95,7 @@ def list_files():
 
 @google_drive_bp.get('/file/<file_id>')
 @jwt_required()
+@prefer_replica
 def get_file_metadata(file_id):
     """Obtém metadados de um arquivo específico do Google Drive."""
     try:
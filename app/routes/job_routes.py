@@ -0,0 +1,25 @@
+from flask import Blueprint
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.services.job_service import JobService
+
+job_bp = Blueprint("jobs", __name__)
+
+
+@job_bp.get("/")
+@jwt_required()
+def list_jobs():
+    """Lista os jobs mais recentes do usuário"""
+    user_id = get_jwt_identity()
+    jobs = [JobService.to_dict(job) for job in JobService.list_jobs(user_id)]
+    return {"success": True, "jobs": jobs, "count": len(jobs)}, 200
+
+
+@job_bp.get("/<job_id>")
+@jwt_required()
+def get_job(job_id):
+    """Status, progresso e (quando concluído) resultado de um job"""
+    user_id = get_jwt_identity()
+    job = JobService.get_job(job_id, user_id)
+    if not job:
+        return {"success": False, "message": "Job não encontrado"}, 404
+    return {"success": True, "job": JobService.to_dict(job, include_result=job.status == 'completed')}, 200
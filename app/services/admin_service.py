@@ -0,0 +1,21 @@
+from functools import wraps
+from flask import current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+
+def is_admin(user_id) -> bool:
+    """Verifica se o usuário está na lista ADMIN_USER_IDS da configuração."""
+    if user_id is None:
+        return False
+    return str(user_id) in current_app.config.get('ADMIN_USER_IDS', set())
+
+
+def admin_required(fn):
+    """Decorator para rotas restritas a administradores (exige JWT válido)."""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin(get_jwt_identity()):
+            return {"success": False, "message": "Acesso restrito a administradores"}, 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,300 @@
+import math
+import sqlite3
+import time
+import uuid
+from functools import wraps
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from app.services.storage_service import StorageService
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfer_slots (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transfer_slots_user ON transfer_slots(user_id);
+CREATE TABLE IF NOT EXISTS token_buckets (
+    scope TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_initialized_paths = set()
+
+
+class AdmissionRejected(Exception):
+    """Transferência recusada por limite de concorrência ou banda."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class AdmissionService:
+    """Limites de concorrência e banda por usuário e globais.
+
+    O estado fica num SQLite compartilhado (STORAGE_PATH/.system/admission.db),
+    então todos os workers do gunicorn enxergam os mesmos slots e buckets.
+    """
+
+    @staticmethod
+    def _connect():
+        db_path = current_app.config.get('ADMISSION_DB_PATH') or \
+            str(StorageService.get_system_directory('admission') / 'admission.db')
+        conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+        if db_path not in _initialized_paths:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized_paths.add(db_path)
+        return conn
+
+    @staticmethod
+    def try_acquire_slot(user_id, kind):
+        """Tenta reservar um slot de transferência; retorna o id do slot ou None"""
+        config = current_app.config
+        now = time.time()
+        conn = AdmissionService._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Slots de workers que morreram sem liberar expiram pelo TTL
+            conn.execute('DELETE FROM transfer_slots WHERE expires_at < ?', (now,))
+            user_count = conn.execute(
+                'SELECT COUNT(*) FROM transfer_slots WHERE user_id = ?', (str(user_id),)
+            ).fetchone()[0]
+            global_count = conn.execute('SELECT COUNT(*) FROM transfer_slots').fetchone()[0]
+
+            if user_count >= config['ADMISSION_MAX_CONCURRENT_PER_USER'] or \
+                    global_count >= config['ADMISSION_MAX_CONCURRENT_GLOBAL']:
+                conn.execute('ROLLBACK')
+                return None
+
+            slot_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO transfer_slots (id, user_id, kind, expires_at) VALUES (?, ?, ?, ?)',
+                (slot_id, str(user_id), kind, now + config['ADMISSION_SLOT_TTL'])
+            )
+            conn.execute('COMMIT')
+            return slot_id
+        finally:
+            conn.close()
+
+    @staticmethod
+    def release_slot(slot_id):
+        conn = AdmissionService._connect()
+        try:
+            conn.execute('DELETE FROM transfer_slots WHERE id = ?', (slot_id,))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def acquire_slot(user_id, kind):
+        """Espera na fila por um slot; lança AdmissionRejected ao estourar o tempo máximo"""
+        max_wait = current_app.config['ADMISSION_MAX_QUEUE_WAIT']
+        deadline = time.monotonic() + max_wait
+        delay = 0.02
+
+        while True:
+            slot_id = AdmissionService.try_acquire_slot(user_id, kind)
+            if slot_id:
+                return slot_id
+            if time.monotonic() + delay > deadline:
+                raise AdmissionRejected(
+                    'Muitas transferências simultâneas. Tente novamente em instantes.',
+                    retry_after=max(1, math.ceil(max_wait))
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    @staticmethod
+    def bandwidth_limited():
+        config = current_app.config
+        return config['ADMISSION_USER_BANDWIDTH'] > 0 or config['ADMISSION_GLOBAL_BANDWIDTH'] > 0
+
+    @staticmethod
+    def reserve_bandwidth(user_id, nbytes, max_wait=None):
+        """Reserva nbytes nos token buckets do usuário e global.
+
+        Retorna quantos segundos o chamador deve aguardar antes de transferir.
+        Com ``max_wait``, se a espera passar desse limite nada é reservado e
+        AdmissionRejected é lançada com o Retry-After adequado.
+        """
+        config = current_app.config
+        buckets = []
+        if config['ADMISSION_USER_BANDWIDTH'] > 0:
+            buckets.append((f"user:{user_id}", config['ADMISSION_USER_BANDWIDTH']))
+        if config['ADMISSION_GLOBAL_BANDWIDTH'] > 0:
+            buckets.append(('global', config['ADMISSION_GLOBAL_BANDWIDTH']))
+        if not buckets or nbytes <= 0:
+            return 0.0
+
+        now = time.time()
+        conn = AdmissionService._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            states = []
+            wait = 0.0
+            for scope, rate in buckets:
+                capacity = rate * config['ADMISSION_BURST_SECONDS']
+                row = conn.execute(
+                    'SELECT tokens, updated_at FROM token_buckets WHERE scope = ?', (scope,)
+                ).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                # Tokens podem ficar negativos: a dívida é paga com a espera retornada
+                remaining = tokens - nbytes
+                wait = max(wait, -remaining / rate if remaining < 0 else 0.0)
+                states.append((scope, remaining))
+
+            if max_wait is not None and wait > max_wait:
+                conn.execute('ROLLBACK')
+                raise AdmissionRejected(
+                    'Limite de banda excedido. Tente novamente mais tarde.',
+                    retry_after=max(1, math.ceil(wait - max_wait))
+                )
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO token_buckets (scope, tokens, updated_at) VALUES (?, ?, ?)',
+                [(scope, remaining, now) for scope, remaining in states]
+            )
+            conn.execute('COMMIT')
+            return wait
+        finally:
+            conn.close()
+
+
+class BandwidthThrottle:
+    """Aplica os token buckets conforme os bytes passam, em blocos de ADMISSION_BANDWIDTH_CHUNK.
+
+    Só o primeiro bloco passa pela fila de admissão (ADMISSION_MAX_QUEUE_WAIT);
+    os seguintes esperam o tempo que for preciso, o que mantém a transferência
+    na taxa configurada sem limitar o tamanho total.
+    """
+
+    def __init__(self, app, user_id):
+        self.app = app
+        self.user_id = user_id
+        self.chunk = app.config['ADMISSION_BANDWIDTH_CHUNK']
+        self.credit = 0
+
+    def admit(self, expected_size):
+        first = min(self.chunk, expected_size) if expected_size else self.chunk
+        self._reserve(first, self.app.config['ADMISSION_MAX_QUEUE_WAIT'])
+
+    def consume(self, nbytes):
+        if nbytes > self.credit:
+            self._reserve(max(nbytes - self.credit, self.chunk))
+        self.credit -= nbytes
+
+    def _reserve(self, nbytes, max_wait=None):
+        with self.app.app_context():
+            wait = AdmissionService.reserve_bandwidth(self.user_id, nbytes, max_wait)
+        self.credit += nbytes
+        if wait:
+            time.sleep(wait)
+
+
+class _ThrottledStream:
+    """Envolve request.stream para que o corpo do upload seja lido na taxa permitida"""
+
+    def __init__(self, stream, throttle):
+        self._stream = stream
+        self._throttle = throttle
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._throttle.consume(len(data))
+        return data
+
+    def readline(self, size=-1):
+        data = self._stream.readline(size)
+        self._throttle.consume(len(data))
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+def _throttled_body(body, throttle):
+    try:
+        for chunk in body:
+            throttle.consume(len(chunk))
+            yield chunk
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def _rejected_response(exc):
+    return {"success": False, "message": exc.message}, 429, {"Retry-After": str(exc.retry_after)}
+
+
+def admission_controlled(kind):
+    """Decorator para rotas de transferência (usar depois de @jwt_required).
+
+    Reserva um slot de concorrência antes da view e o libera quando a resposta
+    termina de ser enviada. Com limite de banda, o corpo do upload (request.stream)
+    e o da resposta do download passam pelos token buckets bloco a bloco.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('ADMISSION_ENABLED'):
+                return fn(*args, **kwargs)
+
+            user_id = get_jwt_identity()
+            try:
+                slot_id = AdmissionService.acquire_slot(user_id, kind)
+            except AdmissionRejected as exc:
+                return _rejected_response(exc)
+
+            # O corpo é enviado depois que o contexto da requisição já foi desfeito
+            app = current_app._get_current_object()
+            throttle = BandwidthThrottle(app, user_id) if AdmissionService.bandwidth_limited() else None
+
+            response = None
+            try:
+                if kind == 'upload' and throttle and request.content_length:
+                    throttle.admit(request.content_length)
+                    request.stream = _ThrottledStream(request.stream, throttle)
+
+                response = current_app.make_response(fn(*args, **kwargs))
+
+                if kind == 'download' and throttle and response.status_code in (200, 206):
+                    throttle.admit(response.content_length)
+                    # Sem passthrough: o servidor itera o corpo (sem sendfile) e o ritmo é controlado aqui
+                    response.response = _throttled_body(response.response, throttle)
+                    response.direct_passthrough = False
+            except AdmissionRejected as exc:
+                if response is not None:
+                    response.close()
+                AdmissionService.release_slot(slot_id)
+                return _rejected_response(exc)
+            except Exception:
+                AdmissionService.release_slot(slot_id)
+                raise
+
+            def release():
+                with app.app_context():
+                    AdmissionService.release_slot(slot_id)
+
+            body = response.response
+            if response.direct_passthrough and hasattr(body, 'close'):
+                # send_file entrega o file wrapper direto ao servidor WSGI, que
+                # chama apenas body.close() (call_on_close não seria executado)
+                close_body = body.close
+
+                def close():
+                    try:
+                        close_body()
+                    finally:
+                        release()
+
+                body.close = close
+            else:
+                response.call_on_close(release)
+            return response
+        return wrapper
+    return decorator
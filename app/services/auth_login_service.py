@@ -1,7 +1,10 @@
 from app.models import User
+from app.extensions import db
 
 def authenticate_user(email, password):
     user = User.query.filter_by(email=email).first()
-    if user and user.password == password:
+    if user and user.check_password(password):
+        if db.session.is_modified(user):
+            db.session.commit()  # hash regravado com os parâmetros atuais
         return user
     return None
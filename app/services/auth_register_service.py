@@ -24,7 +24,8 @@ def register_user(username, email, password):
         print(f"[REGISTER][{datetime.datetime.now()}] Falha: email já cadastrado", file=sys.stderr)
         return None, 'Email já cadastrado.'
 
-    user = User(username=username, email=email, password=password)
+    user = User(username=username, email=email)
+    user.set_password(password)
     db.session.add(user)
 
     try:
@@ -0,0 +1,155 @@
+import posixpath
+from concurrent.futures import as_completed
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.services import storage_events
+from app.services.executors import LazyExecutor
+from app.services.folder_service import FolderService
+from app.services.job_service import JobService
+from app.services.storage_service import StorageService, StorageOperationError
+
+_executor = LazyExecutor('BATCH_WORKERS', 'batch-ops')
+
+# Fases executadas em sequência (cada uma em paralelo): pastas criadas no lote
+# já existem quando arquivos são criados/copiados/movidos para dentro delas
+PHASES = ('mkdir', 'create', 'copy', 'move', 'delete')
+
+
+class BatchService:
+    """Executa listas de operações de arquivo (mkdir, create, copy, move, delete)"""
+
+    @staticmethod
+    def _get_executor():
+        return _executor.get()
+
+    @staticmethod
+    def validate(user_id, operations):
+        """Normaliza as operações; retorna (válidas, resultados de falha de validação)"""
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        valid, invalid = [], []
+        sources, destinations = set(), set()
+
+        for index, raw in enumerate(operations):
+            op = raw.get('op') if isinstance(raw, dict) else None
+            item = {'index': index, 'op': op, 'path': storage_events.to_relative(
+                (raw.get('path') if isinstance(raw, dict) else None) or ''
+            )}
+
+            def reject(message):
+                invalid.append({**item, 'success': False, 'message': message})
+
+            if op not in PHASES:
+                reject('Operação inválida')
+                continue
+            try:
+                StorageService.resolve_user_path(user_id, item['path'], user_root)
+                if op in ('copy', 'move'):
+                    item['target_path'] = storage_events.to_relative(raw.get('target_path') or '')
+                    StorageService.resolve_user_path(user_id, item['target_path'], user_root)
+            except ValueError:
+                reject('Caminho inválido')
+                continue
+
+            if op in ('mkdir', 'create'):
+                item['name'] = raw.get('name')
+                if not secure_filename(item['name'] or ''):
+                    reject('Nome inválido')
+                    continue
+            else:
+                if not item['path']:
+                    reject('Caminho é obrigatório')
+                    continue
+                # Dois itens do lote não podem disputar a mesma origem ou o mesmo destino
+                if op in ('move', 'delete'):
+                    if item['path'] in sources:
+                        reject('Caminho repetido no lote')
+                        continue
+                    sources.add(item['path'])
+                if op in ('copy', 'move'):
+                    destination = posixpath.join(item['target_path'], posixpath.basename(item['path']))
+                    if destination in destinations:
+                        reject('Destino repetido no lote')
+                        continue
+                    destinations.add(destination)
+
+            valid.append(item)
+
+        return valid, invalid
+
+    @staticmethod
+    def _execute_one(app, user_id, user_root, item):
+        with app.app_context():
+            op = item['op']
+            try:
+                if op == 'mkdir':
+                    result = StorageService.create_folder(user_id, item['path'], item['name'], user_root)
+                elif op == 'create':
+                    result = StorageService.create_empty_file(user_id, item['path'], item['name'], user_root)
+                elif op in ('copy', 'move', 'delete') and (user_root / item['path']).is_dir():
+                    # Pastas viram jobs próprios; o item devolve o id para acompanhamento
+                    if op == 'copy':
+                        job = FolderService.schedule_copy(user_id, item['path'], item['target_path'], user_root)
+                    elif op == 'move':
+                        job = FolderService.schedule_move(user_id, item['path'], item['target_path'], user_root)
+                    else:
+                        job = FolderService.schedule_delete(user_id, item['path'], user_root)
+                    result = {'job_id': job.id}
+                elif op == 'move':
+                    result = StorageService.move_file(user_id, item['path'], item['target_path'], user_root)
+                elif op == 'copy':
+                    result = StorageService.copy_file(user_id, item['path'], item['target_path'], user_root)
+                else:
+                    result = StorageService.delete_path(user_id, item['path'], user_root)
+                return {'index': item['index'], 'op': op, 'path': item['path'], 'success': True, 'result': result}
+            except StorageOperationError as e:
+                message = e.message
+            except Exception as e:
+                print(f"❌ Erro na operação em lote ({op} {item['path']}): {e}")
+                message = f'Erro ao executar operação: {str(e)}'
+            return {'index': item['index'], 'op': op, 'path': item['path'], 'success': False, 'message': message}
+
+    @staticmethod
+    def execute(user_id, operations, progress=None):
+        """Executa as operações válidas em paralelo (limitado a BATCH_WORKERS), fase a fase.
+
+        Retorna a lista de resultados na ordem original dos itens.
+        """
+        valid, results = BatchService.validate(user_id, operations)
+        if progress is not None and results:
+            progress.advance(len(results), failed=len(results))
+
+        app = current_app._get_current_object()
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        executor = BatchService._get_executor()
+
+        for phase in PHASES:
+            futures = [
+                executor.submit(BatchService._execute_one, app, user_id, user_root, item)
+                for item in valid if item['op'] == phase
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if progress is not None:
+                    progress.advance(failed=0 if result['success'] else 1)
+
+        results.sort(key=lambda r: r['index'])
+        return results
+
+    @staticmethod
+    def summarize(results):
+        succeeded = sum(1 for r in results if r['success'])
+        return {
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        }
+
+    @staticmethod
+    def submit_job(user_id, operations):
+        """Executa o lote como job em segundo plano"""
+        def run(progress):
+            return BatchService.summarize(BatchService.execute(user_id, operations, progress))
+
+        return JobService.submit(user_id, 'batch', len(operations), run)
+
@@ -0,0 +1,171 @@
+import datetime
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import ChangeJournalEntry, ChangeJournalWatermark
+from app.services import storage_events
+
+# Acorda long-polls deste worker assim que uma mudança é gravada; outros
+# workers percebem a mudança pelo polling periódico do banco
+_changes_condition = threading.Condition()
+LONGPOLL_RECHECK_SECONDS = 1.0
+
+
+class ChangeJournalService:
+    """Journal append-only por usuário para sincronização incremental (delta-sync)"""
+
+    @staticmethod
+    def init_app(app):
+        storage_events.subscribe(ChangeJournalService._on_storage_event)
+        app.cli.add_command(compact_journal_command)
+
+    @staticmethod
+    def _lock_user_row(user_id, advance=0):
+        """Trava a linha de sequência do usuário (criando-a se preciso) e avança ``last_seq``.
+
+        A trava vem do próprio UPDATE, que vale tanto no PostgreSQL/MySQL (lock
+        de linha) quanto no SQLite (que ignora SELECT ... FOR UPDATE).
+        """
+        stmt = update(ChangeJournalWatermark).where(
+            ChangeJournalWatermark.user_id == user_id
+        ).values(last_seq=ChangeJournalWatermark.last_seq + advance)
+        if not db.session.execute(stmt).rowcount:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ChangeJournalWatermark(user_id=user_id, compacted_through=0, last_seq=0))
+            except IntegrityError:
+                pass  # outro worker criou a linha ao mesmo tempo
+            db.session.execute(stmt)
+        return db.session.execute(
+            select(ChangeJournalWatermark).where(ChangeJournalWatermark.user_id == user_id)
+            .execution_options(populate_existing=True)
+        ).scalar_one()
+
+    @staticmethod
+    def _on_storage_event(action, user_id, path, dest_path=None, is_dir=False, **info):
+        # O cursor é uma sequência por usuário atribuída sob a trava da linha: as
+        # entradas de um usuário são confirmadas na ordem do cursor, então um
+        # cliente nunca avança além de uma entrada que ainda vai aparecer (com o
+        # id autoincremento, um commit mais lento podia surgir abaixo do cursor)
+        user_id = int(user_id)
+        sequence = ChangeJournalService._lock_user_row(user_id, advance=1)
+        db.session.add(ChangeJournalEntry(
+            user_id=user_id,
+            seq=sequence.last_seq,
+            action=action,
+            path=path,
+            dest_path=dest_path,
+            is_dir=is_dir or action == storage_events.MKDIR,
+            size=info.get('size'),
+            created_at=datetime.datetime.now()
+        ))
+        db.session.commit()
+        with _changes_condition:
+            _changes_condition.notify_all()
+
+    @staticmethod
+    def get_latest_cursor(user_id):
+        watermark = db.session.get(ChangeJournalWatermark, int(user_id))
+        return watermark.last_seq if watermark else 0
+
+    @staticmethod
+    def get_changes(user_id, since, limit=500):
+        """Mudanças com cursor > since; retorna dict com changes, cursor, has_more e reset.
+
+        ``reset`` indica que o cursor é anterior à compactação: o cliente precisa
+        refazer a listagem completa e continuar a partir do cursor retornado.
+        """
+        user_id = int(user_id)
+        watermark = db.session.get(ChangeJournalWatermark, user_id)
+        if watermark and since < watermark.compacted_through:
+            return {
+                'changes': [],
+                'cursor': ChangeJournalService.get_latest_cursor(user_id),
+                'has_more': False,
+                'reset': True
+            }
+
+        rows = ChangeJournalEntry.query.filter(
+            ChangeJournalEntry.user_id == user_id,
+            ChangeJournalEntry.seq > since
+        ).order_by(ChangeJournalEntry.seq).limit(limit + 1).all()
+
+        changes = [{
+            'cursor': entry.seq,
+            'action': entry.action,
+            'path': entry.path,
+            'dest_path': entry.dest_path,
+            'type': 'dir' if entry.is_dir else 'file',
+            'size': entry.size,
+            'at': entry.created_at.isoformat()
+        } for entry in rows[:limit]]
+
+        return {
+            'changes': changes,
+            'cursor': changes[-1]['cursor'] if changes else since,
+            'has_more': len(rows) > limit,
+            'reset': False
+        }
+
+    @staticmethod
+    def wait_for_changes(user_id, since, limit=500, timeout=0):
+        """Long-poll: bloqueia até haver mudanças ou até o timeout (segundos)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            result = ChangeJournalService.get_changes(user_id, since, limit)
+            remaining = deadline - time.monotonic()
+            if result['changes'] or result['reset'] or remaining <= 0:
+                return result
+            # Encerra a transação para enxergar inserções feitas por outros workers
+            db.session.rollback()
+            with _changes_condition:
+                _changes_condition.wait(timeout=min(remaining, LONGPOLL_RECHECK_SECONDS))
+
+    @staticmethod
+    def compact(user_id=None):
+        """Remove entradas antigas (retenção por idade e por quantidade) e avança o watermark"""
+        config = current_app.config
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=config['JOURNAL_RETENTION_DAYS'])
+        max_entries = config['JOURNAL_MAX_ENTRIES_PER_USER']
+
+        if user_id is not None:
+            user_ids = [int(user_id)]
+        else:
+            user_ids = [row[0] for row in db.session.query(ChangeJournalEntry.user_id).distinct()]
+
+        removed = 0
+        for uid in user_ids:
+            # Cursor mais alto a remover: o mais novo entre "velho demais" e "excedente"
+            through = db.session.query(func.max(ChangeJournalEntry.seq)).filter(
+                ChangeJournalEntry.user_id == uid, ChangeJournalEntry.created_at < cutoff
+            ).scalar() or 0
+            overflow = ChangeJournalEntry.query.with_entities(ChangeJournalEntry.seq).filter(
+                ChangeJournalEntry.user_id == uid
+            ).order_by(ChangeJournalEntry.seq.desc()).offset(max_entries).limit(1).scalar()
+            through = max(through, overflow or 0)
+            if not through:
+                continue
+
+            watermark = ChangeJournalService._lock_user_row(uid)
+            result = db.session.execute(delete(ChangeJournalEntry).where(
+                ChangeJournalEntry.user_id == uid, ChangeJournalEntry.seq <= through
+            ))
+            removed += result.rowcount
+            watermark.compacted_through = max(watermark.compacted_through, through)
+            db.session.commit()
+
+        return removed
+
+
+@click.command('journal-compact')
+@click.option('--user-id', type=int, default=None, help='Compacta apenas este usuário')
+@with_appcontext
+def compact_journal_command(user_id):
+    """Compacta o journal de mudanças conforme a política de retenção."""
+    removed = ChangeJournalService.compact(user_id)
+    print(f"🧹 {removed} entradas removidas do journal")
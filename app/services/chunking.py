@@ -0,0 +1,65 @@
+"""Chunking definido pelo conteúdo (CDC) para deduplicar versões de arquivos.
+
+Os limites de cada chunk dependem só dos bytes próximos (hash rolante Gear),
+então uma edição no meio do arquivo altera apenas os chunks ao redor dela e o
+restante continua deduplicado entre versões. Usa o pacote ``fastcdc`` quando
+instalado; o fallback em Python puro segue o mesmo princípio, porém é lento
+para arquivos grandes (roda em segundo plano). Os cortes das duas implementações
+diferem, então trocar de uma para a outra reduz a deduplicação só na transição.
+"""
+import hashlib
+
+try:
+    import fastcdc  # opcional: chunking em código nativo
+except ImportError:
+    fastcdc = None
+
+_MASK_64 = 0xFFFFFFFFFFFFFFFF
+_WINDOW = 64  # bytes que influenciam o hash Gear de 64 bits
+
+# Tabela Gear determinística: os mesmos bytes geram os mesmos cortes entre processos
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+
+
+def _gear_chunks(fileobj, min_size, avg_size, max_size):
+    bits = max(avg_size.bit_length() - 1, 1)
+    # Bits altos: dependem dos últimos 64 bytes, não só dos mais recentes
+    mask = ((1 << bits) - 1) << (64 - bits)
+    gear = _GEAR
+    buf = bytearray()
+    eof = False
+
+    while True:
+        while not eof and len(buf) < max_size:
+            data = fileobj.read(max_size)
+            if data:
+                buf += data
+            else:
+                eof = True
+        if not buf:
+            return
+
+        end = min(len(buf), max_size)
+        cut = end
+        if end > min_size:
+            h = 0
+            for i in range(max(min_size - _WINDOW, 0), end):
+                h = ((h << 1) + gear[buf[i]]) & _MASK_64
+                if i >= min_size and not h & mask:
+                    cut = i + 1
+                    break
+        yield bytes(buf[:cut])
+        del buf[:cut]
+
+
+def iter_chunks(fileobj, min_size, avg_size, max_size):
+    """Gera os chunks (bytes) de um arquivo aberto para leitura binária"""
+    if fastcdc is not None:
+        for chunk in fastcdc.fastcdc(fileobj, min_size, avg_size, max_size, fat=True):
+            yield chunk.data
+        return
+    yield from _gear_chunks(fileobj, min_size, avg_size, max_size)
+
+
+def chunk_hash(data):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,67 @@
+import gzip
+from pathlib import Path
+from flask import current_app
+
+try:
+    import zstandard  # opcional: habilita COMPRESSION_ALGORITHM=zstd
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def choose_encoding(filename, size):
+    """Define a codificação em disco para um novo arquivo (None = gravar sem compressão)"""
+    config = current_app.config
+    if not config.get('COMPRESSION_ENABLED') or size < config['COMPRESSION_MIN_SIZE']:
+        return None
+    if Path(filename).suffix.lower().lstrip('.') not in config['COMPRESSIBLE_EXTENSIONS']:
+        return None
+
+    algorithm = config['COMPRESSION_ALGORITHM']
+    if algorithm == 'zstd' and zstandard is None:
+        return 'gzip'
+    return algorithm
+
+
+class _NullWriter:
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def write(self, data):
+        return self._fileobj.write(data)
+
+    def close(self):
+        pass
+
+
+def open_writer(fileobj, encoding):
+    """Envolve um arquivo binário aberto para escrita comprimindo em streaming"""
+    if encoding is None:
+        return _NullWriter(fileobj)
+    level = current_app.config['COMPRESSION_LEVEL']
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).stream_writer(fileobj, closefd=False)
+    # mtime=0 deixa a saída determinística (mesmo conteúdo => mesmos bytes)
+    return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=min(level, 9), mtime=0)
+
+
+def open_reader(path, encoding):
+    """Abre um arquivo do storage devolvendo os bytes originais (descomprimidos)"""
+    if encoding is None:
+        return open(path, 'rb')
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Arquivo comprimido com zstd, mas o pacote zstandard não está instalado')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def iter_decompressed(path, encoding, chunk_size=CHUNK_SIZE):
+    """Gera o conteúdo descomprimido em blocos (para respostas em streaming)"""
+    with open_reader(path, encoding) as reader:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,180 @@
+import bisect
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+REPLICA_PREFIX = 'replica_'
+
+# Limites (ms) do histograma de espera por conexão
+_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    """Tempo de espera no checkout de conexões do pool (contagem, total, máximo e histograma)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.buckets[bisect.bisect_left(_BUCKETS_MS, waited * 1000)] += 1
+
+    def _percentile(self, fraction):
+        total = sum(self.buckets)
+        if not total:
+            return 0
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= total * fraction:
+                return _BUCKETS_MS[index] if index < len(_BUCKETS_MS) else None
+        return None
+
+    def to_dict(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / attempts * 1000, 3) if attempts else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                # Limite superior do bucket (None = acima do maior limite)
+                'p50_wait_ms_max': self._percentile(0.5),
+                'p99_wait_ms_max': self._percentile(0.99),
+                'histogram_ms': {
+                    (f"<={limit}" if index < len(_BUCKETS_MS) else f">{_BUCKETS_MS[-1]}"): self.buckets[index]
+                    for index, limit in enumerate(_BUCKETS_MS + (None,))
+                }
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mede quanto cada checkout esperou por uma conexão livre"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+class RoutingSession(Session):
+    """Sessão que manda SELECTs para uma réplica quando a rota pediu (``prefer_replica``).
+
+    Depois de qualquer escrita a sessão fica presa ao primário até o fim da
+    requisição, para que a própria escrita seja visível (réplicas têm atraso).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            replicas = current_app.config['DB_REPLICA_KEYS']
+            return self._db.engines[random.choice(replicas)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if clause is not None and not isinstance(clause, Select):
+            self.info['wrote'] = True  # INSERT/UPDATE/DELETE ou SQL textual
+            return False
+        if self.info.get('wrote') or not isinstance(clause, Select):
+            return False
+        if clause._for_update_arg is not None:
+            return False
+        return (has_app_context() and g.get('db_prefer_replica', False)
+                and bool(current_app.config['DB_REPLICA_KEYS']))
+
+
+def use_primary(session):
+    """Prende a sessão ao primário pelo resto da requisição (leituras que decidem escritas)"""
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['wrote'] = True
+
+
+def prefer_replica(fn):
+    """Decorator para rotas somente leitura: consultas vão para uma réplica, se houver"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_prefer_replica = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+class DatabaseService:
+    """Opções do pool de conexões, réplicas de leitura e métricas de checkout"""
+
+    @staticmethod
+    def _pool_options(config, url):
+        if url.startswith('sqlite') and (url in ('sqlite://', 'sqlite:///') or ':memory:' in url):
+            return {}  # banco em memória usa StaticPool (uma conexão só)
+        return {
+            'poolclass': TimedQueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING']
+        }
+
+    @staticmethod
+    def configure(app):
+        """Monta as opções dos engines; deve rodar antes de ``db.init_app``"""
+        config = app.config
+        options = DatabaseService._pool_options(config, config['SQLALCHEMY_DATABASE_URI'])
+        # SQLALCHEMY_ENGINE_OPTIONS explícito continua tendo prioridade
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        replica_keys = []
+        for index, url in enumerate(config['DB_REPLICA_URIS']):
+            key = f"{REPLICA_PREFIX}{index}"
+            binds[key] = {'url': url, **DatabaseService._pool_options(config, url)}
+            replica_keys.append(key)
+        config['SQLALCHEMY_BINDS'] = binds
+        config['DB_REPLICA_KEYS'] = replica_keys
+
+    @staticmethod
+    def pool_metrics(engines):
+        result = {}
+        for key, engine in engines.items():
+            pool = engine.pool
+            info = {'pool': pool.status()}
+            if isinstance(pool, QueuePool):
+                info.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'overflow': pool.overflow(),
+                    'checked_in': pool.checkedin()
+                })
+            if isinstance(pool, TimedQueuePool):
+                info['checkout_wait'] = pool.metrics.to_dict()
+            result[key or 'primary'] = info
+        return result
@@ -0,0 +1,26 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class LazyExecutor:
+    """ThreadPoolExecutor do processo, criado no primeiro uso.
+
+    O tamanho vem da config da app (``config_key``), lida só na criação,
+    então precisa ser chamado dentro de um contexto de app.
+    """
+
+    def __init__(self, config_key, thread_name_prefix):
+        self.config_key = config_key
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=current_app.config[self.config_key],
+                    thread_name_prefix=self.thread_name_prefix
+                )
+            return self._executor
@@ -0,0 +1,79 @@
+"""Cópia de arquivos dentro do servidor sem passar os bytes pelo Python.
+
+Ordem de tentativa: reflink (FICLONE: btrfs, XFS, bcachefs — cópia instantânea
+que compartilha blocos), ``os.copy_file_range`` (cópia no kernel, que em alguns
+filesystems também vira reflink/server-side copy), ``os.sendfile`` e, por
+último, ``shutil.copyfileobj``.
+"""
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int)
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Erros que indicam "método não suportado aqui" (tenta o próximo)
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+                errno.EBADF, errno.EPERM, errno.ETXTBSY}
+
+
+def _reflink(src_fd, dst_fd, size):
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'FICLONE indisponível')
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(size - offset, CHUNK_SIZE), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+
+
+def _sendfile(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(size - offset, CHUNK_SIZE))
+        if sent == 0:
+            break
+        offset += sent
+
+
+_METHODS = [('reflink', _reflink)]
+if hasattr(os, 'copy_file_range'):
+    _METHODS.append(('copy_file_range', _copy_file_range))
+if hasattr(os, 'sendfile'):
+    _METHODS.append(('sendfile', _sendfile))
+
+
+def copy_file(src, dest):
+    """Copia ``src`` para ``dest`` (que não pode existir); retorna o método usado.
+
+    Levanta FileExistsError se o destino já existe.
+    """
+    with open(src, 'rb') as fsrc, open(dest, 'xb') as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(src_fd).st_size
+
+        for name, method in _METHODS:
+            try:
+                method(src_fd, dst_fd, size)
+                if os.fstat(dst_fd).st_size == size:
+                    return name
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+            # Falhou (ou copiou parcialmente): recomeça do zero com o próximo método
+            os.ftruncate(dst_fd, 0)
+
+        fsrc.seek(0)
+        fdst.seek(0)
+        shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+        return 'userspace'
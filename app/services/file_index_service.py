@@ -0,0 +1,347 @@
+import datetime
+import os
+import posixpath
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, insert, or_, func
+from app.extensions import db
+from app.models import FileEntry, FileIndexState
+from app.services import storage_events
+from app.services.storage_service import StorageService
+from app.services.database_service import use_primary
+
+BULK_INSERT_SIZE = 1000
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _subtree_filter(user_id, path):
+    """Filtro SQL para o próprio caminho e tudo abaixo dele"""
+    return (FileEntry.user_id == user_id) & or_(
+        FileEntry.path == path,
+        FileEntry.path.like(f"{_escape_like(path)}/%", escape='\\')
+    )
+
+
+class FileIndexService:
+    """Índice de nomes e caminhos por usuário, mantido pelos eventos de storage.
+
+    Permite buscar por nome (prefixo/substring), extensão, tamanho e data
+    sem tocar no filesystem.
+    """
+
+    @staticmethod
+    def init_app(app):
+        storage_events.subscribe(FileIndexService._on_storage_event)
+        app.cli.add_command(reindex_files_command)
+
+    @staticmethod
+    def _entry_values(user_id, path, is_dir, stat=None):
+        name = posixpath.basename(path)
+        return {
+            'user_id': user_id,
+            'path': path,
+            'parent': posixpath.dirname(path),
+            'name': name,
+            'name_lower': name.lower(),
+            'extension': '' if is_dir else posixpath.splitext(name)[1].lower().lstrip('.')[:32],
+            'is_dir': is_dir,
+            'size': 0 if is_dir or stat is None else stat.st_size,
+            'stored_size': 0 if is_dir or stat is None else stat.st_size,
+            'encoding': None,
+            'modified_at': datetime.datetime.fromtimestamp(stat.st_mtime) if stat else None,
+            'sha256': None,
+            'verified_at': None,
+            'corrupt': False,
+        }
+
+    @staticmethod
+    def _on_storage_event(action, user_id, path, dest_path=None, is_dir=False, **info):
+        user_id = int(user_id)
+        if action in (storage_events.CREATED, storage_events.MKDIR):
+            FileIndexService.upsert_path(user_id, path, size=info.get('size'), encoding=info.get('encoding'),
+                                         sha256=info.get('sha256'))
+        elif action == storage_events.DELETED:
+            FileIndexService.remove_path(user_id, path, progress=info.get('progress'))
+        elif action == storage_events.MOVED:
+            FileIndexService.move_path(user_id, path, dest_path, progress=info.get('progress'))
+        db.session.commit()
+
+    @staticmethod
+    def upsert_path(user_id, path, size=None, encoding=None, sha256=None):
+        """Registra (ou atualiza) um caminho e garante as pastas ancestrais no índice.
+
+        ``size``/``encoding`` descrevem arquivos comprimidos em disco (tamanho lógico);
+        ``sha256`` é o checksum do conteúdo original, quando conhecido.
+        """
+        if not path:
+            return
+        user_root = StorageService.get_user_directory(user_id)
+        target = user_root / path
+        try:
+            stat = target.stat()
+        except FileNotFoundError:
+            return
+
+        ancestors = []
+        parent = posixpath.dirname(path)
+        while parent:
+            ancestors.append(parent)
+            parent = posixpath.dirname(parent)
+
+        wanted = [path] + ancestors
+        existing = {
+            entry.path: entry for entry in
+            FileEntry.query.filter(FileEntry.user_id == user_id, FileEntry.path.in_(wanted))
+        }
+
+        for current in wanted:
+            current_is_dir = current != path or target.is_dir()
+            current_stat = stat if current == path else None
+            values = FileIndexService._entry_values(user_id, current, current_is_dir, current_stat)
+            if current == path and encoding:
+                values['size'] = size
+                values['encoding'] = encoding
+            if current == path and sha256:
+                values['sha256'] = sha256
+                values['verified_at'] = datetime.datetime.now()
+            entry = existing.get(current)
+            if entry is None:
+                if current_stat is None:
+                    values['modified_at'] = datetime.datetime.fromtimestamp((user_root / current).stat().st_mtime)
+                db.session.add(FileEntry(**values))
+            elif current == path:
+                entry.size = values['size']
+                entry.stored_size = values['stored_size']
+                entry.encoding = values['encoding']
+                entry.modified_at = values['modified_at']
+                entry.is_dir = values['is_dir']
+                entry.sha256 = values['sha256']
+                entry.verified_at = values['verified_at']
+                entry.corrupt = False
+
+    @staticmethod
+    def remove_path(user_id, path, progress=None):
+        """Remove um arquivo ou uma pasta inteira do índice.
+
+        Com ``progress`` (jobs), remove em blocos confirmando cada um: o uso do
+        usuário diminui aos poucos e o progresso avança por entrada removida.
+        """
+        if progress is None:
+            db.session.execute(delete(FileEntry).where(_subtree_filter(user_id, path)))
+            return
+
+        while True:
+            ids = [row[0] for row in db.session.query(FileEntry.id).filter(
+                _subtree_filter(user_id, path)
+            ).limit(BULK_INSERT_SIZE)]
+            if not ids:
+                break
+            db.session.execute(delete(FileEntry).where(FileEntry.id.in_(ids)))
+            db.session.commit()
+            progress.advance(len(ids))
+
+    @staticmethod
+    def move_path(user_id, path, dest_path, progress=None):
+        """Reescreve os caminhos de um arquivo/pasta movido (e de todo o conteúdo).
+
+        Com ``progress`` (jobs), reescreve em blocos confirmando cada um.
+        """
+        last_id = 0
+        moved_any = False
+        while True:
+            q = FileEntry.query.filter(_subtree_filter(user_id, path), FileEntry.id > last_id).order_by(FileEntry.id)
+            entries = q.limit(BULK_INSERT_SIZE).all() if progress is not None else q.all()
+            if not entries:
+                break
+            moved_any = True
+            last_id = entries[-1].id
+
+            for entry in entries:
+                new_path = dest_path + entry.path[len(path):]
+                values = FileIndexService._entry_values(user_id, new_path, entry.is_dir)
+                entry.path = new_path
+                entry.parent = values['parent']
+                entry.name = values['name']
+                entry.name_lower = values['name_lower']
+                entry.extension = values['extension']
+            if progress is None:
+                break
+            db.session.commit()
+            progress.advance(len(entries))
+
+        if not moved_any:
+            FileIndexService.upsert_path(user_id, dest_path)
+            return
+        # Pastas de destino criadas implicitamente também entram no índice
+        parent = posixpath.dirname(dest_path)
+        if parent:
+            db.session.flush()
+            FileIndexService.upsert_path(user_id, parent)
+
+    @staticmethod
+    def get_subtree_usage(user_id, path, logical=False):
+        """(bytes, quantidade de arquivos) indexados no caminho e abaixo dele"""
+        column = FileEntry.size if logical else FileEntry.stored_size
+        used, files_count = db.session.query(
+            func.coalesce(func.sum(column), 0), func.count(FileEntry.id)
+        ).filter(_subtree_filter(int(user_id), path), FileEntry.is_dir.is_(False)).one()
+        return int(used), int(files_count)
+
+    @staticmethod
+    def get_subtree_files(user_id, path):
+        """{caminho: FileEntry} dos arquivos indexados no caminho e abaixo dele"""
+        return {
+            entry.path: entry
+            for entry in FileEntry.query.filter(_subtree_filter(int(user_id), path), FileEntry.is_dir.is_(False))
+        }
+
+    @staticmethod
+    def count_subtree(user_id, path):
+        """Quantidade de entradas indexadas no caminho e abaixo dele"""
+        return FileEntry.query.filter(_subtree_filter(int(user_id), path)).count()
+
+    @staticmethod
+    def rebuild_user(user_id):
+        """Reconstrói o índice do usuário a partir do disco; retorna o total de entradas"""
+        user_id = int(user_id)
+        user_root = StorageService.get_user_directory(user_id)
+
+        # Codificação e checksum não são dedutíveis do disco: preserva o que já
+        # era conhecido enquanto o arquivo não mudou de tamanho
+        known_entries = {
+            row.path: row
+            for row in db.session.query(
+                FileEntry.path, FileEntry.size, FileEntry.stored_size, FileEntry.encoding,
+                FileEntry.sha256, FileEntry.verified_at, FileEntry.corrupt
+            ).filter(FileEntry.user_id == user_id,
+                     or_(FileEntry.encoding.isnot(None), FileEntry.sha256.isnot(None)))
+        }
+        db.session.execute(delete(FileEntry).where(FileEntry.user_id == user_id))
+
+        total = 0
+        batch = []
+        stack = ['']
+        while stack:
+            relative_dir = stack.pop()
+            with os.scandir(user_root / relative_dir) as it:
+                for item in it:
+                    path = posixpath.join(relative_dir, item.name) if relative_dir else item.name
+                    is_dir = item.is_dir(follow_symlinks=False)
+                    if is_dir:
+                        stack.append(path)
+                    values = FileIndexService._entry_values(user_id, path, is_dir, item.stat())
+                    known = known_entries.get(path)
+                    if known and not is_dir and known.stored_size == values['stored_size']:
+                        values['size'], values['encoding'] = known.size, known.encoding
+                        values['sha256'], values['verified_at'] = known.sha256, known.verified_at
+                        values['corrupt'] = known.corrupt
+                    batch.append(values)
+                    if len(batch) >= BULK_INSERT_SIZE:
+                        db.session.execute(insert(FileEntry), batch)
+                        total += len(batch)
+                        batch = []
+        if batch:
+            db.session.execute(insert(FileEntry), batch)
+            total += len(batch)
+
+        state = db.session.get(FileIndexState, user_id)
+        if state is None:
+            state = FileIndexState(user_id=user_id, indexed_at=datetime.datetime.now())
+            db.session.add(state)
+        else:
+            state.indexed_at = datetime.datetime.now()
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def ensure_index(user_id):
+        """Constrói o índice na primeira utilização (arquivos que já existiam no disco)"""
+        user_id = int(user_id)
+        if db.session.get(FileIndexState, user_id) is None:
+            # Pode ser só atraso da réplica: confirma no primário antes de reconstruir
+            use_primary(db.session)
+            if db.session.get(FileIndexState, user_id) is None:
+                FileIndexService.rebuild_user(user_id)
+
+    @staticmethod
+    def search(user_id, query='', mode='prefix', extensions=None, entry_type=None,
+               min_size=None, max_size=None, modified_after=None, modified_before=None,
+               path='', page=1, per_page=50):
+        """Busca por nome/caminho somente no índice; retorna (itens, has_more).
+
+        ``prefix`` usa o índice (user_id, name_lower); ``substring`` (LIKE '%q%')
+        não tem índice que ajude e percorre todas as entradas do usuário.
+        """
+        user_id = int(user_id)
+        FileIndexService.ensure_index(user_id)
+
+        q = FileEntry.query.filter(FileEntry.user_id == user_id)
+        if query and mode == 'prefix':
+            # Intervalo em vez de LIKE 'q%': o SQLite só usa o índice para LIKE com COLLATE NOCASE
+            prefix = query.lower()
+            q = q.filter(FileEntry.name_lower >= prefix, FileEntry.name_lower < prefix + '\uffff')
+        elif query:
+            pattern = f"%{_escape_like(query.lower())}%"
+            q = q.filter(FileEntry.name_lower.like(pattern, escape='\\'))
+        if path:
+            q = q.filter(FileEntry.path.like(f"{_escape_like(path)}/%", escape='\\'))
+        if extensions:
+            q = q.filter(FileEntry.extension.in_(extensions))
+        if entry_type in ('file', 'dir'):
+            q = q.filter(FileEntry.is_dir == (entry_type == 'dir'))
+        if min_size is not None:
+            q = q.filter(FileEntry.size >= min_size)
+        if max_size is not None:
+            q = q.filter(FileEntry.size <= max_size)
+        if modified_after is not None:
+            q = q.filter(FileEntry.modified_at >= modified_after)
+        if modified_before is not None:
+            q = q.filter(FileEntry.modified_at <= modified_before)
+
+        rows = (q.order_by(FileEntry.is_dir.desc(), FileEntry.name_lower, FileEntry.path)
+                .offset((page - 1) * per_page).limit(per_page + 1).all())
+
+        items = [{
+            'type': 'dir' if entry.is_dir else 'file',
+            'name': entry.name,
+            'path': entry.path,
+            'size': entry.size,
+            'modified_at': entry.modified_at.isoformat() if entry.modified_at else None
+        } for entry in rows[:per_page]]
+        return items, len(rows) > per_page
+
+    @staticmethod
+    def get_usage(user_id, logical=False):
+        """(bytes usados, quantidade de arquivos) do usuário segundo o índice"""
+        user_id = int(user_id)
+        FileIndexService.ensure_index(user_id)
+        column = FileEntry.size if logical else FileEntry.stored_size
+        used, files_count = db.session.query(
+            func.coalesce(func.sum(column), 0), func.count(FileEntry.id)
+        ).filter(FileEntry.user_id == user_id, FileEntry.is_dir.is_(False)).one()
+        return int(used), int(files_count)
+
+    @staticmethod
+    def get_total_usage(logical=False):
+        """(bytes usados, quantidade de arquivos) somando todos os usuários indexados"""
+        column = FileEntry.size if logical else FileEntry.stored_size
+        used, files_count = db.session.query(
+            func.coalesce(func.sum(column), 0), func.count(FileEntry.id)
+        ).filter(FileEntry.is_dir.is_(False)).one()
+        return int(used), int(files_count)
+
+
+@click.command('files-reindex')
+@click.option('--user-id', type=int, default=None, help='Reconstrói apenas este usuário')
+@with_appcontext
+def reindex_files_command(user_id):
+    """Reconstrói o índice de nomes/caminhos a partir do disco."""
+    from app.models import User
+
+    user_ids = [user_id] if user_id else [user.id for user in User.query.all()]
+    for uid in user_ids:
+        total = FileIndexService.rebuild_user(uid)
+        print(f"🗂️ Usuário {uid}: {total} entradas indexadas")
@@ -0,0 +1,204 @@
+import errno
+import os
+import shutil
+import uuid
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+from app.services import fast_copy
+from app.services import storage_events
+from app.services.file_index_service import FileIndexService
+from app.services.job_service import JobService
+from app.services.storage_service import StorageService, StorageOperationError
+
+
+class FolderService:
+    """Movimentação, cópia e exclusão recursiva de pastas, executadas como jobs"""
+
+    @staticmethod
+    def init_app(app):
+        app.cli.add_command(purge_trash_command)
+
+    @staticmethod
+    def get_trash_directory():
+        # Dentro do STORAGE_PATH: mesmo filesystem, então mover para a lixeira é um rename
+        return StorageService.get_system_directory('trash')
+
+    @staticmethod
+    def _resolve_folder(user_id, relative_path, user_root):
+        try:
+            folder = StorageService.resolve_user_path(user_id, relative_path, user_root)
+        except ValueError:
+            raise StorageOperationError('Caminho inválido')
+        if folder == user_root or not folder.is_dir():
+            raise StorageOperationError('Pasta não encontrada', 404)
+        return folder
+
+    @staticmethod
+    def schedule_move(user_id, source, target_path='', user_root=None):
+        """Agenda a movimentação de uma pasta (e de todo o conteúdo) para ``target_path``"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        folder = FolderService._resolve_folder(user_id, source, user_root)
+        try:
+            dest_dir = StorageService.resolve_user_path(user_id, target_path, user_root)
+        except ValueError:
+            raise StorageOperationError('Caminho de destino inválido')
+        if dest_dir == folder or folder in dest_dir.parents:
+            raise StorageOperationError('Não é possível mover uma pasta para dentro dela mesma')
+        dest = dest_dir / folder.name
+        if dest.exists():
+            raise StorageOperationError('Pasta de destino já existe')
+
+        relative = folder.relative_to(user_root).as_posix()
+        dest_relative = dest.relative_to(user_root).as_posix()
+
+        def run(progress):
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            if dest.exists():
+                raise RuntimeError('Pasta de destino já existe')
+            folder.rename(dest)
+            print(f"📦 Pasta movida: {folder} -> {dest}")
+            storage_events.emit(storage_events.MOVED, user_id, relative, dest_path=dest_relative,
+                                is_dir=True, progress=progress)
+            progress.flush()
+            return {'path': relative, 'dest_path': dest_relative}
+
+        total = FileIndexService.count_subtree(user_id, relative)
+        return JobService.submit(user_id, 'move_folder', total, run)
+
+    @staticmethod
+    def schedule_copy(user_id, source, target_path='', user_root=None, new_name=None):
+        """Agenda a cópia recursiva de uma pasta (reflink/copy_file_range por arquivo)"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        folder = FolderService._resolve_folder(user_id, source, user_root)
+        try:
+            dest_dir = StorageService.resolve_user_path(user_id, target_path, user_root)
+        except ValueError:
+            raise StorageOperationError('Caminho de destino inválido')
+        if dest_dir == folder or folder in dest_dir.parents:
+            raise StorageOperationError('Não é possível copiar uma pasta para dentro dela mesma')
+        name = secure_filename(new_name) if new_name else folder.name
+        if not name:
+            raise StorageOperationError('Nome inválido')
+        dest = dest_dir / name
+        if dest.exists():
+            raise StorageOperationError('Pasta de destino já existe')
+
+        relative = folder.relative_to(user_root).as_posix()
+        dest_relative = dest.relative_to(user_root).as_posix()
+
+        # Cota verificada pelo índice (soma da subárvore), sem varrer o disco
+        StorageService.get_user_storage_info(user_id)  # garante o índice construído
+        logical = current_app.config['QUOTA_ACCOUNTING'] == 'logical'
+        needed, _ = FileIndexService.get_subtree_usage(user_id, relative, logical=logical)
+        if not StorageService.has_space_available(needed, user_id):
+            raise StorageOperationError('Espaço de armazenamento esgotado')
+
+        def run(progress):
+            indexed = FileIndexService.get_subtree_files(user_id, relative)
+            dest.mkdir(parents=True)
+            storage_events.emit(storage_events.MKDIR, user_id, dest_relative, is_dir=True)
+            progress.advance()
+            files = 0
+            methods = {}
+
+            for current, dirs, names in os.walk(folder):
+                current_relative = os.path.relpath(current, folder)
+                target_dir = dest if current_relative == '.' else dest / current_relative
+                for name in dirs:
+                    (target_dir / name).mkdir()
+                    storage_events.emit(storage_events.MKDIR, user_id,
+                                        (target_dir / name).relative_to(user_root).as_posix(), is_dir=True)
+                    progress.advance()
+                for name in names:
+                    method = fast_copy.copy_file(os.path.join(current, name), target_dir / name)
+                    methods[method] = methods.get(method, 0) + 1
+                    copy_relative = (target_dir / name).relative_to(user_root).as_posix()
+                    source_relative = relative + copy_relative[len(dest_relative):]
+                    storage_events.emit(storage_events.CREATED, user_id, copy_relative,
+                                        **StorageService.entry_metadata(indexed.get(source_relative)))
+                    files += 1
+                    progress.advance()
+
+            progress.flush()
+            print(f"📄 Pasta copiada: {folder} -> {dest} ({files} arquivos)")
+            return {'path': relative, 'dest_path': dest_relative, 'files': files, 'methods': methods}
+
+        total = FileIndexService.count_subtree(user_id, relative)
+        return JobService.submit(user_id, 'copy_folder', total, run)
+
+    @staticmethod
+    def schedule_delete(user_id, relative_path, user_root=None):
+        """Move a pasta para a lixeira (instantâneo) e agenda a remoção do conteúdo.
+
+        O DELETED sai junto com o rename: se o usuário recriar o mesmo caminho
+        antes do job rodar, os arquivos novos não são apagados do índice, do
+        journal nem das versões. O job só apaga fisicamente a cópia na lixeira.
+        """
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        folder = FolderService._resolve_folder(user_id, relative_path, user_root)
+        relative = folder.relative_to(user_root).as_posix()
+        job_id = uuid.uuid4().hex
+
+        trash = FolderService.get_trash_directory() / job_id
+        try:
+            folder.rename(trash)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # STORAGE_PATH montado em mais de um filesystem: apaga no lugar
+            trash = folder
+        print(f"🗑️ Pasta enviada para a lixeira: {folder}")
+        total = FileIndexService.count_subtree(user_id, relative)
+        storage_events.emit(storage_events.DELETED, user_id, relative, is_dir=True)
+
+        def run(progress):
+            removed = FolderService._remove_tree(trash, progress)
+            progress.flush()
+            return {'path': relative, 'removed': removed}
+
+        return JobService.submit(user_id, 'delete_folder', total, run, job_id=job_id)
+
+    @staticmethod
+    def _remove_tree(root, progress=None):
+        """Apaga uma árvore de baixo para cima, avançando o progresso por entrada"""
+        removed = 0
+        for current, dirs, files in os.walk(root, topdown=False):
+            for name in files:
+                os.unlink(os.path.join(current, name))
+            for name in dirs:
+                path = os.path.join(current, name)
+                if os.path.islink(path):
+                    os.unlink(path)
+                else:
+                    os.rmdir(path)
+            count = len(files) + len(dirs)
+            removed += count
+            if progress is not None and count:
+                progress.advance(count)
+        os.rmdir(root)
+        return removed
+
+    @staticmethod
+    def purge_trash():
+        """Remove sobras da lixeira cujo job não está mais ativo (ex.: processo reiniciado)"""
+        JobService.recover_orphans()
+        purged = 0
+        for item in FolderService.get_trash_directory().iterdir():
+            if JobService.is_active(item.name):
+                continue
+            if item.is_dir() and not item.is_symlink():
+                shutil.rmtree(item, ignore_errors=True)
+            else:
+                item.unlink(missing_ok=True)
+            purged += 1
+        return purged
+
+
+@click.command('trash-purge')
+@with_appcontext
+def purge_trash_command():
+    """Apaga pastas deixadas na lixeira por exclusões interrompidas."""
+    purged = FolderService.purge_trash()
+    print(f"🧹 {purged} itens removidos da lixeira")
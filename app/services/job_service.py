@@ -0,0 +1,177 @@
+import datetime
+import json
+import os
+import socket
+import time
+import uuid
+from flask import current_app
+from app.extensions import db
+from app.models import Job
+from app.services.executors import LazyExecutor
+
+_executor = LazyExecutor('JOB_WORKERS', 'jobs')
+_INTERRUPTED = 'Interrompido: o processo que executava o job foi encerrado'
+
+
+class JobProgress:
+    """Repassa o progresso de um job ao banco, no máximo a cada JOB_PROGRESS_INTERVAL"""
+
+    def __init__(self, job_id, interval):
+        self.job_id = job_id
+        self.interval = interval
+        self.processed = 0
+        self.failed = 0
+        self._last_flush = 0.0
+
+    def advance(self, processed=1, failed=0):
+        self.processed += processed
+        self.failed += failed
+        now = time.monotonic()
+        if now - self._last_flush >= self.interval:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self):
+        Job.query.filter_by(id=self.job_id).update({'processed': self.processed, 'failed': self.failed})
+        db.session.commit()
+
+
+class JobService:
+    """Executa operações longas fora da requisição e registra status/progresso"""
+
+    @staticmethod
+    def _get_executor():
+        return _executor.get()
+
+    @staticmethod
+    def _owner():
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _owner_alive(owner):
+        """O processo dono do job ainda existe? (só dá para saber no mesmo host)"""
+        host, _, pid = (owner or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            return owner is not None  # outro host: confia no status gravado
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # existe, mas é de outro usuário
+        return True
+
+    @staticmethod
+    def recover_orphans():
+        """Marca como falhos os jobs pendentes/em execução cujo processo morreu (ex.: restart).
+
+        Jobs rodam em threads do processo que os criou; sem ele, ninguém mais
+        atualizaria essas linhas. Retorna quantos jobs foram marcados.
+        """
+        orphans = [job for job in Job.query.filter(Job.status.in_(('pending', 'running')))
+                   if not JobService._owner_alive(job.owner)]
+        for job in orphans:
+            job.status = 'failed'
+            job.error = _INTERRUPTED
+            job.finished_at = datetime.datetime.now()
+        if orphans:
+            db.session.commit()
+            print(f"⚠️ {len(orphans)} jobs interrompidos marcados como falhos")
+        return len(orphans)
+
+    @staticmethod
+    def submit(user_id, kind, total, fn, job_id=None):
+        """Cria o job e agenda ``fn(progress)``; o retorno de fn vira o resultado (JSON)"""
+        job = Job(
+            id=job_id or uuid.uuid4().hex,
+            user_id=int(user_id),
+            kind=kind,
+            status='pending',
+            total=total,
+            owner=JobService._owner(),
+            created_at=datetime.datetime.now()
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        job_id = job.id
+
+        def run():
+            with app.app_context():
+                JobService._run(job_id, fn)
+
+        JobService._get_executor().submit(run)
+        return job
+
+    @staticmethod
+    def _run(job_id, fn):
+        job = db.session.get(Job, job_id)
+        job.status = 'running'
+        job.started_at = datetime.datetime.now()
+        db.session.commit()
+
+        progress = JobProgress(job_id, current_app.config['JOB_PROGRESS_INTERVAL'])
+        try:
+            result = fn(progress)
+            status, error = 'completed', None
+        except Exception as e:
+            print(f"❌ Erro no job {job_id}: {e}")
+            db.session.rollback()
+            result, status, error = None, 'failed', str(e)
+
+        job = db.session.get(Job, job_id)
+        job.status = status
+        job.error = error
+        job.processed = progress.processed
+        job.failed = progress.failed
+        job.result = json.dumps(result) if result is not None else None
+        job.finished_at = datetime.datetime.now()
+        db.session.commit()
+
+    @staticmethod
+    def get_job(job_id, user_id):
+        job = db.session.get(Job, job_id)
+        if job is None or job.user_id != int(user_id):
+            return None
+        return job
+
+    @staticmethod
+    def list_jobs(user_id, limit=50):
+        return Job.query.filter_by(user_id=int(user_id)).order_by(Job.created_at.desc()).limit(limit).all()
+
+    @staticmethod
+    def _percentage(job):
+        if job.status == 'completed':
+            return 100
+        if not job.total:
+            return 0
+        # O total é estimado pelo índice; o disco pode ter um pouco mais
+        return min(round(job.processed / job.total * 100, 2), 99.99)
+
+    @staticmethod
+    def is_active(job_id):
+        """Pendente/em execução e com o processo dono vivo"""
+        job = db.session.get(Job, job_id)
+        return job is not None and job.status in ('pending', 'running') and JobService._owner_alive(job.owner)
+
+    @staticmethod
+    def to_dict(job, include_result=False):
+        data = {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'total': job.total,
+            'processed': job.processed,
+            'failed': job.failed,
+            'progress': JobService._percentage(job),
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+        if include_result:
+            data['result'] = json.loads(job.result) if job.result else None
+        return data
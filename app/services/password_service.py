@@ -0,0 +1,136 @@
+import hmac
+import multiprocessing
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Formato do werkzeug: "scrypt:N:r:p$salt$hash" (ou "pbkdf2:sha256:iter$salt$hash")
+_HASH_RE = re.compile(r'^(scrypt|pbkdf2):[\w:]+\$[^$]+\$[0-9a-f]+$')
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def _pool_context():
+    """Contexto forkserver: os processos do pool não herdam threads, locks nem
+    conexões do worker web (fork depois de threads pode travar no filho).
+
+    O servidor pré-carrega só este módulo: pré-carregar o __main__ (ex.: app.py)
+    executaria create_app() de novo dentro do forkserver.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+class PasswordHashBusy(Exception):
+    """Fila de hashing cheia: o login deve ser tentado de novo em instantes"""
+
+
+def _is_hash(stored):
+    return bool(stored) and _HASH_RE.match(stored) is not None
+
+
+def _method_of(stored):
+    return stored.split('$', 1)[0] if _is_hash(stored) else None
+
+
+def _hash_task(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify_task(stored, password, method):
+    """Confere a senha e, se os parâmetros mudaram (ou era texto puro), devolve o novo hash"""
+    if _is_hash(stored):
+        ok = check_password_hash(stored, password)
+    else:
+        # Senhas antigas gravadas em texto puro: migradas no primeiro login
+        ok = hmac.compare_digest(stored.encode(), password.encode())
+    if ok and _method_of(stored) != method:
+        return True, generate_password_hash(password, method)
+    return ok, None
+
+
+class PasswordService:
+    """Hash de senhas com scrypt (memory-hard) executado num pool de processos limitado.
+
+    Cada hash ocupa um núcleo por ~100ms; fora do processo web os workers do
+    servidor continuam livres, e a fila limitada devolve 503 em vez de acumular
+    logins quando há uma rajada de tentativas.
+    """
+
+    @staticmethod
+    def init_app(app):
+        app.cli.add_command(calibrate_passwords_command)
+
+    @staticmethod
+    def _run(fn, *args):
+        global _executor, _slots
+        config = current_app.config
+        workers = config['PASSWORD_HASH_WORKERS']
+        if workers <= 0:
+            return fn(*args)  # sem pool (desenvolvimento): roda na própria thread
+
+        with _executor_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(workers + config['PASSWORD_HASH_MAX_QUEUE'])
+                _executor = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        if not _slots.acquire(timeout=config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+            raise PasswordHashBusy('Fila de verificação de senhas cheia')
+        try:
+            return _executor.submit(fn, *args).result()
+        finally:
+            _slots.release()
+
+    @staticmethod
+    def hash_password(password):
+        return PasswordService._run(_hash_task, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+    @staticmethod
+    def verify_password(stored, password):
+        """Retorna (senha correta, novo hash ou None quando não é preciso regravar)"""
+        if not stored or not password:
+            return False, None
+        return PasswordService._run(_verify_task, stored, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+    @staticmethod
+    def calibrate(target_ms, max_memory_mb=256, r=8, p=1, rounds=3):
+        """Mede o scrypt neste host e retorna o maior N (potência de 2) dentro do tempo alvo"""
+        results = []
+        n = 2 ** 14
+        while 128 * n * r * p <= max_memory_mb * 1024 * 1024:
+            method = f"scrypt:{n}:{r}:{p}"
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                generate_password_hash('calibration', method)
+                timings.append((time.perf_counter() - started) * 1000)
+            elapsed = statistics.median(timings)
+            results.append((method, elapsed))
+            if elapsed > target_ms:
+                break
+            n *= 2
+
+        within = [item for item in results if item[1] <= target_ms]
+        chosen = within[-1] if within else results[0]
+        return chosen, results
+
+
+@click.command('passwords-calibrate')
+@click.option('--target-ms', type=float, default=100, help='Tempo alvo por hash, em milissegundos')
+@click.option('--max-memory-mb', type=int, default=256, help='Memória máxima por hash')
+def calibrate_passwords_command(target_ms, max_memory_mb):
+    """Escolhe os parâmetros do scrypt para o tempo alvo neste host."""
+    (method, elapsed), results = PasswordService.calibrate(target_ms, max_memory_mb)
+    for candidate, ms in results:
+        print(f"⏱️ {candidate}: {ms:.1f}ms")
+    print(f"✅ Use PASSWORD_HASH_METHOD={method} ({elapsed:.1f}ms por hash)")
+    print("   Senhas existentes são regravadas com os novos parâmetros no próximo login")
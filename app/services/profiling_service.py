@@ -0,0 +1,253 @@
+import collections
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from flask import current_app, g, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import event
+from app.extensions import db
+from app.services.admin_service import is_admin
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Eventos de auditoria (PEP 578) que correspondem a syscalls de filesystem.
+# stat/lstat não geram eventos de auditoria, então não entram na contagem.
+FS_AUDIT_EVENTS = frozenset({
+    'open', 'os.listdir', 'os.scandir', 'os.mkdir', 'os.rmdir', 'os.remove',
+    'os.rename', 'os.truncate', 'os.chmod', 'os.utime', 'os.link', 'os.symlink',
+    'shutil.copyfile', 'shutil.copytree', 'shutil.move', 'shutil.rmtree',
+})
+
+# Estado da requisição sendo perfilada na thread atual (None = nada a coletar)
+_local = threading.local()
+
+
+class _StackSampler(threading.Thread):
+    """Amostra periodicamente a pilha da thread da requisição (formato "folded")."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class _RequestProfile:
+    """Coleta de uma única requisição: pilhas, queries SQL e syscalls de FS."""
+
+    def __init__(self, profile_id, request_id, mode, interval):
+        self.profile_id = profile_id
+        self.request_id = request_id
+        self.mode = mode
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.slow_queries = []
+        self.fs_ops = collections.Counter()
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = _StackSampler(threading.get_ident(), interval)
+            self.profiler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started_at
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def record_query(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        self.slow_queries.append((seconds, statement))
+        self.slow_queries.sort(key=lambda item: item[0], reverse=True)
+        del self.slow_queries[5:]
+
+
+class ProfilingService:
+    """Profiling opt-in por requisição para administradores.
+
+    Uma requisição é perfilada quando um administrador envia o header
+    ``X-Profile: 1`` ou quando cai na amostragem ``PROFILING_SAMPLE_RATE``.
+    Com ``PROFILING_ENABLED`` desligado nenhum hook é registrado.
+    """
+
+    @staticmethod
+    def init_app(app):
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+
+        app.config['PROFILING_OUTPUT_DIR'].mkdir(parents=True, exist_ok=True)
+        sys.addaudithook(ProfilingService._audit_hook)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', ProfilingService._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', ProfilingService._after_cursor_execute)
+
+        app.before_request(ProfilingService._start_profile)
+        app.after_request(ProfilingService._finish_profile)
+        app.teardown_request(ProfilingService._discard_profile)
+
+    @staticmethod
+    def _audit_hook(name, args):
+        profile = getattr(_local, 'profile', None)
+        if profile is not None and name in FS_AUDIT_EVENTS:
+            profile.fs_ops[name] += 1
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_local, 'profile', None) is not None:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = getattr(_local, 'profile', None)
+        starts = conn.info.get('profile_query_start')
+        if profile is not None and starts:
+            profile.record_query(statement, time.perf_counter() - starts.pop())
+
+    @staticmethod
+    def _should_profile():
+        config = current_app.config
+        if not request.path.startswith(config['PROFILING_PATH_PREFIX']):
+            return False
+
+        if request.headers.get('X-Profile') == '1':
+            try:
+                verify_jwt_in_request(optional=True)
+                return is_admin(get_jwt_identity())
+            except Exception:
+                return False
+
+        rate = config['PROFILING_SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    @staticmethod
+    def _start_profile():
+        if not ProfilingService._should_profile():
+            return
+
+        # O id do profile é sempre gerado aqui: um X-Request-ID repetido pelo cliente
+        # sobrescreveria um profile já salvo. O id do cliente fica nos metadados.
+        request_id = request.headers.get('X-Request-ID', '')
+        if not PROFILE_ID_PATTERN.match(request_id):
+            request_id = None
+
+        config = current_app.config
+        g.request_profile = _RequestProfile(
+            uuid.uuid4().hex, request_id, config['PROFILING_MODE'], config['PROFILING_SAMPLE_INTERVAL']
+        )
+        _local.profile = g.request_profile
+
+    @staticmethod
+    def _finish_profile(response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        _local.profile = None
+        profile.stop()
+
+        try:
+            ProfilingService._write_profile(profile, response.status_code)
+            response.headers['X-Profile-Id'] = profile.profile_id
+        except OSError as e:
+            print(f"❌ Erro ao salvar profile {profile.profile_id}: {e}")
+        return response
+
+    @staticmethod
+    def _discard_profile(exc=None):
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            _local.profile = None
+            profile.stop()
+
+    @staticmethod
+    def _write_profile(profile, status_code):
+        output_dir = current_app.config['PROFILING_OUTPUT_DIR']
+
+        if profile.mode == 'cprofile':
+            profile_file = f"{profile.profile_id}.prof"
+            profile.profiler.dump_stats(str(output_dir / profile_file))
+            samples = None
+        else:
+            profile_file = f"{profile.profile_id}.folded"
+            with open(output_dir / profile_file, 'w', encoding='utf-8') as fh:
+                for stack, count in profile.profiler.stacks.items():
+                    fh.write(f"{stack} {count}\n")
+            samples = sum(profile.profiler.stacks.values())
+
+        metadata = {
+            'id': profile.profile_id,
+            'request_id': profile.request_id,
+            'method': request.method,
+            'path': request.full_path,
+            'status': status_code,
+            'mode': profile.mode,
+            'profile_file': profile_file,
+            'samples': samples,
+            'created_at': time.time(),
+            'duration_ms': round(profile.duration * 1000, 3),
+            'sql': {
+                'count': profile.sql_count,
+                'total_ms': round(profile.sql_seconds * 1000, 3),
+                'slowest': [
+                    {'ms': round(seconds * 1000, 3), 'statement': statement}
+                    for seconds, statement in profile.slow_queries
+                ],
+            },
+            'fs_syscalls': dict(profile.fs_ops),
+        }
+        with open(output_dir / f"{profile.profile_id}.json", 'w', encoding='utf-8') as fh:
+            json.dump(metadata, fh, indent=2)
+
+    @staticmethod
+    def get_profile(profile_id):
+        """Retorna os metadados de um profile salvo (ou None)."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        meta_path = current_app.config['PROFILING_OUTPUT_DIR'] / f"{profile_id}.json"
+        if not meta_path.exists():
+            return None
+        with open(meta_path, encoding='utf-8') as fh:
+            return json.load(fh)
+
+    @staticmethod
+    def list_profiles(limit=50):
+        """Lista os profiles mais recentes (metadados resumidos)."""
+        output_dir = current_app.config['PROFILING_OUTPUT_DIR']
+        if not output_dir.exists():
+            return []
+        metas = sorted(output_dir.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+        profiles = []
+        for meta_path in metas[:limit]:
+            with open(meta_path, encoding='utf-8') as fh:
+                meta = json.load(fh)
+            profiles.append({key: meta.get(key) for key in ('id', 'request_id', 'method', 'path', 'status', 'duration_ms', 'created_at')})
+        return profiles
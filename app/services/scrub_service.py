@@ -0,0 +1,156 @@
+import datetime
+import hashlib
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.extensions import db
+from app.models import FileEntry
+from app.services import compression
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class RateLimiter:
+    """Limita a vazão de leitura (bytes/s) dormindo sempre que estiver adiantado"""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        self.consumed += amount
+        ahead = self.consumed / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _drop_page_cache(path):
+    """Evita que a varredura expulse do page cache os arquivos usados pelos usuários"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class ScrubService:
+    """Verifica arquivos armazenados contra o SHA-256 gravado no upload (bit rot, escrita parcial)"""
+
+    @staticmethod
+    def init_app(app):
+        app.cli.add_command(scrub_storage_command)
+
+    @staticmethod
+    def verify_entry(entry, limiter):
+        """Relê um arquivo e compara o checksum; retorna ok | corrupt | backfilled | missing | changed"""
+        file_path = current_app.config['STORAGE_PATH'] / f"user_{entry.user_id}" / entry.path
+        try:
+            before = file_path.stat()
+        except FileNotFoundError:
+            return 'missing'
+
+        digest = hashlib.sha256()
+        try:
+            with compression.open_reader(file_path, entry.encoding) as reader:
+                while True:
+                    block = reader.read(READ_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    limiter.consume(len(block))
+        except Exception:
+            # Conteúdo comprimido ilegível (gzip/zstd) também é corrupção
+            digest = None
+        finally:
+            _drop_page_cache(file_path)
+
+        after = file_path.stat() if file_path.exists() else None
+        if after is None or (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+            return 'changed'  # modificado durante a leitura: fica para a próxima rodada
+
+        if digest is None:
+            # Ilegível é corrupção mesmo sem checksum gravado (não há o que comparar)
+            result = 'corrupt'
+        elif entry.sha256 is None:
+            # Arquivos anteriores ao checksum no upload: registra o primeiro valor lido
+            entry.sha256 = digest.hexdigest()
+            result = 'backfilled'
+        else:
+            result = 'ok' if digest.hexdigest() == entry.sha256 else 'corrupt'
+        entry.corrupt = result == 'corrupt'
+        entry.verified_at = datetime.datetime.now()
+        db.session.commit()
+        return result
+
+    @staticmethod
+    def scrub(user_id=None, bytes_per_second=None, limit=None):
+        """Verifica os arquivos cuja última verificação é mais antiga que SCRUB_INTERVAL_DAYS.
+
+        Os nunca verificados vêm primeiro; retorna a contagem por resultado.
+        """
+        config = current_app.config
+        if bytes_per_second is None:
+            bytes_per_second = config['SCRUB_MAX_BYTES_PER_SECOND']
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=config['SCRUB_INTERVAL_DAYS'])
+
+        q = db.session.query(FileEntry.id).filter(
+            FileEntry.is_dir.is_(False),
+            (FileEntry.verified_at.is_(None)) | (FileEntry.verified_at < cutoff)
+        )
+        if user_id is not None:
+            q = q.filter(FileEntry.user_id == int(user_id))
+        q = q.order_by(FileEntry.verified_at.is_(None).desc(), FileEntry.verified_at, FileEntry.id)
+        if limit:
+            q = q.limit(limit)
+        entry_ids = [row[0] for row in q]
+
+        limiter = RateLimiter(bytes_per_second)
+        counts = {}
+        for entry_id in entry_ids:
+            entry = db.session.get(FileEntry, entry_id)
+            if entry is None:
+                continue
+            result = ScrubService.verify_entry(entry, limiter)
+            counts[result] = counts.get(result, 0) + 1
+            if result == 'corrupt':
+                print(f"❌ Checksum divergente: usuário {entry.user_id}, {entry.path}")
+        return counts
+
+    @staticmethod
+    def list_corrupt(limit=500):
+        entries = FileEntry.query.filter(FileEntry.corrupt.is_(True)).order_by(FileEntry.verified_at.desc()).limit(limit)
+        return [{
+            'user_id': entry.user_id,
+            'path': entry.path,
+            'size': entry.size,
+            'sha256': entry.sha256,
+            'verified_at': entry.verified_at.isoformat() if entry.verified_at else None
+        } for entry in entries]
+
+
+@click.command('scrub-storage')
+@click.option('--user-id', type=int, default=None, help='Verifica apenas este usuário')
+@click.option('--rate', type=int, default=None, help='Bytes por segundo (padrão: SCRUB_MAX_BYTES_PER_SECOND)')
+@click.option('--limit', type=int, default=None, help='Máximo de arquivos nesta rodada')
+@click.option('--loop', is_flag=True, help='Continua rodando, uma rodada a cada SCRUB_LOOP_SECONDS')
+@with_appcontext
+def scrub_storage_command(user_id, rate, limit, loop):
+    """Verifica a integridade dos arquivos armazenados com leitura limitada."""
+    while True:
+        counts = ScrubService.scrub(user_id, rate, limit)
+        summary = ', '.join(f"{result}: {count}" for result, count in sorted(counts.items())) or 'nada a verificar'
+        print(f"🔎 Scrub concluído ({summary})")
+        if not loop:
+            break
+        db.session.remove()
+        time.sleep(current_app.config['SCRUB_LOOP_SECONDS'])
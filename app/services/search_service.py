@@ -0,0 +1,242 @@
+import os
+import re
+import sqlite3
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.services import storage_events
+from app.services.executors import LazyExecutor
+from app.services.storage_service import StorageService
+from app.services.text_extraction import extract_text, is_extractable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS doc_meta (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    name, content, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_executor = LazyExecutor('SEARCH_WORKERS', 'search-index')
+_initialized_paths = set()
+
+
+class SearchService:
+    """Busca full-text no conteúdo dos documentos (um índice FTS5 por usuário).
+
+    O índice é atualizado incrementalmente a partir dos eventos de storage
+    (upload, criação, move, delete) num pool de threads fora da requisição.
+    """
+
+    @staticmethod
+    def init_app(app):
+        if not app.config.get('SEARCH_ENABLED'):
+            return
+        storage_events.subscribe(SearchService._on_storage_event)
+        app.cli.add_command(reindex_search_command)
+
+    @staticmethod
+    def _connect(user_id):
+        db_path = str(StorageService.get_system_directory('search') / f"user_{user_id}.db")
+        conn = sqlite3.connect(db_path, timeout=30)
+        if db_path not in _initialized_paths:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized_paths.add(db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @staticmethod
+    def _get_executor():
+        return _executor.get()
+
+    @staticmethod
+    def _on_storage_event(action, user_id, path, dest_path=None, is_dir=False, **info):
+        if action == storage_events.MKDIR:
+            return
+
+        app = current_app._get_current_object()
+
+        def job():
+            with app.app_context():
+                try:
+                    if action == storage_events.CREATED:
+                        SearchService.index_file(user_id, path, encoding=info.get('encoding'),
+                                                 size=info.get('size'))
+                    elif action == storage_events.DELETED:
+                        SearchService.remove_path(user_id, path)
+                    elif action == storage_events.MOVED:
+                        SearchService.move_path(user_id, path, dest_path)
+                except Exception as e:
+                    print(f"❌ Erro ao indexar {path} (usuário {user_id}): {e}")
+
+        SearchService._get_executor().submit(job)
+
+    @staticmethod
+    def index_file(user_id, path, conn=None, encoding=None, size=None):
+        """Indexa (ou reindexa) um arquivo se o conteúdo mudou desde a última indexação.
+
+        ``size`` é o tamanho lógico (descomprimido), exibido nos resultados da busca.
+        """
+        file_path = StorageService.get_user_directory(user_id) / path
+        if not is_extractable(file_path) or not file_path.is_file():
+            return False
+
+        stat = file_path.stat()
+        if encoding is None or size is None:
+            entry = StorageService.get_file_entry(user_id, path)
+            if encoding is None:
+                encoding = entry.encoding if entry else None
+            if size is None and entry is not None:
+                size = entry.size
+        if not encoding or size is None:
+            size = stat.st_size  # sem compressão o tamanho em disco já é o lógico
+
+        own_conn = conn is None
+        conn = conn or SearchService._connect(user_id)
+        try:
+            row = conn.execute('SELECT id, size, mtime_ns FROM doc_meta WHERE path = ?', (path,)).fetchone()
+            if row and row[1] == size and row[2] == stat.st_mtime_ns:
+                return False
+
+            content = extract_text(file_path, current_app.config['SEARCH_MAX_TEXT_SIZE'], encoding)
+            with conn:
+                if row:
+                    conn.execute('UPDATE doc_meta SET size = ?, mtime_ns = ? WHERE id = ?',
+                                 (size, stat.st_mtime_ns, row[0]))
+                    conn.execute('DELETE FROM documents WHERE rowid = ?', (row[0],))
+                    doc_id = row[0]
+                else:
+                    doc_id = conn.execute(
+                        'INSERT INTO doc_meta (path, size, mtime_ns) VALUES (?, ?, ?)',
+                        (path, size, stat.st_mtime_ns)
+                    ).lastrowid
+                conn.execute('INSERT INTO documents (rowid, name, content) VALUES (?, ?, ?)',
+                             (doc_id, file_path.name, content))
+            return True
+        finally:
+            if own_conn:
+                conn.close()
+
+    @staticmethod
+    def _prefix_condition(path):
+        # Casa o próprio caminho e tudo abaixo dele (sem LIKE, para não escapar % e _)
+        return 'path = ? OR substr(path, 1, ?) = ?', (path, len(path) + 1, f"{path}/")
+
+    @staticmethod
+    def remove_path(user_id, path):
+        """Remove do índice um arquivo ou uma pasta inteira"""
+        condition, params = SearchService._prefix_condition(path)
+        conn = SearchService._connect(user_id)
+        try:
+            with conn:
+                ids = [row[0] for row in conn.execute(f'SELECT id FROM doc_meta WHERE {condition}', params)]
+                conn.executemany('DELETE FROM documents WHERE rowid = ?', [(i,) for i in ids])
+                conn.executemany('DELETE FROM doc_meta WHERE id = ?', [(i,) for i in ids])
+        finally:
+            conn.close()
+
+    @staticmethod
+    def move_path(user_id, path, dest_path):
+        """Atualiza os caminhos após mover um arquivo ou uma pasta"""
+        condition, params = SearchService._prefix_condition(path)
+        conn = SearchService._connect(user_id)
+        try:
+            with conn:
+                rows = conn.execute(f'SELECT id, path FROM doc_meta WHERE {condition}', params).fetchall()
+                for doc_id, old_path in rows:
+                    new_path = dest_path + old_path[len(path):]
+                    conn.execute('UPDATE doc_meta SET path = ? WHERE id = ?', (new_path, doc_id))
+                    conn.execute('UPDATE documents SET name = ? WHERE rowid = ?',
+                                 (new_path.rsplit('/', 1)[-1], doc_id))
+            if not rows:
+                # O evento de criação pode ainda não ter sido processado
+                SearchService.index_file(user_id, dest_path, conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def reindex_user(user_id):
+        """Sincroniza o índice com o disco (indexa novos/alterados, remove ausentes)"""
+        user_root = StorageService.get_user_directory(user_id)
+        conn = SearchService._connect(user_id)
+        indexed = 0
+        try:
+            seen = set()
+            for root, dirs, files in os.walk(user_root):
+                for name in files:
+                    path = StorageService.to_user_relative(user_id, os.path.join(root, name))
+                    seen.add(path)
+                    if SearchService.index_file(user_id, path, conn):
+                        indexed += 1
+
+            stale = [(doc_id,) for doc_id, path in conn.execute('SELECT id, path FROM doc_meta')
+                     if path not in seen]
+            with conn:
+                conn.executemany('DELETE FROM documents WHERE rowid = ?', stale)
+                conn.executemany('DELETE FROM doc_meta WHERE id = ?', stale)
+            return indexed, len(stale)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def build_match_query(query):
+        """Converte o texto digitado numa expressão FTS5 segura (AND, prefixo no último termo)"""
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    @staticmethod
+    def search(user_id, query, page=1, per_page=20):
+        """Busca ranqueada (bm25, nome pesa mais que conteúdo) e paginada"""
+        match = SearchService.build_match_query(query)
+        if not match:
+            return [], False
+
+        conn = SearchService._connect(user_id)
+        try:
+            rows = conn.execute(
+                """
+                SELECT m.path, m.size, snippet(documents, 1, '<mark>', '</mark>', '…', 12),
+                       bm25(documents, 5.0, 1.0) AS rank
+                FROM documents
+                JOIN doc_meta m ON m.id = documents.rowid
+                WHERE documents MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+                """,
+                (match, per_page + 1, (page - 1) * per_page)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        results = [{
+            'path': path,
+            'name': path.rsplit('/', 1)[-1],
+            'size': size,
+            'snippet': snippet,
+            'score': round(-rank, 4),
+        } for path, size, snippet, rank in rows[:per_page]]
+        return results, len(rows) > per_page
+
+
+@click.command('search-reindex')
+@click.option('--user-id', type=int, default=None, help='Reindexa apenas este usuário')
+@with_appcontext
+def reindex_search_command(user_id):
+    """Reconstrói/sincroniza o índice de busca full-text a partir do disco."""
+    from app.models import User
+
+    user_ids = [user_id] if user_id else [user.id for user in User.query.all()]
+    for uid in user_ids:
+        indexed, removed = SearchService.reindex_user(uid)
+        print(f"🔎 Usuário {uid}: {indexed} arquivos indexados, {removed} removidos do índice")
@@ -0,0 +1,39 @@
+"""Notificações de mudanças no storage.
+
+Serviços derivados (índices, journal, etc.) se inscrevem com ``subscribe`` e
+recebem ``listener(action, user_id, path, dest_path=None, is_dir=False, **info)``.
+Os caminhos são relativos à pasta do usuário, no formato POSIX. ``info`` traz
+metadados opcionais do evento (ex.: ``size`` lógico e ``encoding`` de uploads,
+ou ``progress`` de um job, para listeners que processam pastas grandes em blocos).
+
+Ações: ``created`` (arquivo criado/enviado), ``mkdir``, ``moved`` e ``deleted``.
+"""
+
+CREATED = 'created'
+MKDIR = 'mkdir'
+MOVED = 'moved'
+DELETED = 'deleted'
+
+_listeners = []
+
+
+def subscribe(listener):
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def to_relative(path) -> str:
+    """Normaliza um caminho relativo ('' para a raiz do usuário)"""
+    parts = [p for p in str(path).replace('\\', '/').split('/') if p not in ('', '.')]
+    return '/'.join(parts)
+
+
+def emit(action, user_id, path, dest_path=None, is_dir=False, **info):
+    """Notifica todos os listeners; erros de um listener não afetam os demais"""
+    path = to_relative(path)
+    dest_path = to_relative(dest_path) if dest_path is not None else None
+    for listener in list(_listeners):
+        try:
+            listener(action, str(user_id), path, dest_path=dest_path, is_dir=is_dir, **info)
+        except Exception as e:
+            print(f"❌ Erro ao processar evento de storage ({action} {path}): {e}")
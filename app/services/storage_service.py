@@ -3,8 +3,64 @@ import shutil
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from flask import current_app
+from app.services import storage_events
+from app.services import compression
+from app.services import fast_copy
 import hashlib
 import datetime
+import math
+import uuid
+from functools import lru_cache
+
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _iso_seconds(seconds):
+    return datetime.datetime.fromtimestamp(seconds).isoformat()
+
+
+def format_timestamp(timestamp):
+    """Mesmo resultado de datetime.fromtimestamp(timestamp).isoformat(), com menos alocações.
+
+    A parte até os segundos vem de cache: arquivos de uma mesma pasta costumam
+    compartilhar o segundo, então cada entrada só formata os microssegundos.
+    """
+    fraction, seconds = math.modf(timestamp)
+    micro = round(fraction * 1e6)  # mesmo arredondamento (meio para o par) do fromtimestamp
+    if micro >= 1_000_000:
+        seconds, micro = seconds + 1, micro - 1_000_000
+    elif micro < 0:
+        seconds, micro = seconds - 1, micro + 1_000_000
+    prefix = _iso_seconds(int(seconds))
+    return f"{prefix}.{micro:06d}" if micro else prefix
+
+
+def _tree_size(path):
+    """Soma o tamanho em disco dos arquivos de uma árvore (scandir, sem seguir links)"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            continue
+    return total
+
+
+class StorageOperationError(Exception):
+    """Falha de uma operação de storage: mensagem para o cliente e status HTTP"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
 
 class StorageService:
     """Serviço para gerenciar armazenamento de arquivos"""
@@ -36,11 +92,38 @@ class StorageService:
         
         return storage_path
     
+    @staticmethod
+    def get_system_directory(name):
+        """Retorna (criando se necessário) um diretório interno em STORAGE_PATH/.system"""
+        system_dir = current_app.config['STORAGE_PATH'] / '.system' / name
+        system_dir.mkdir(parents=True, exist_ok=True)
+        return system_dir
+
+    @staticmethod
+    def get_staging_path(name, suffix='upload'):
+        """Caminho temporário em .system/uploads para gravar antes de publicar.
+
+        Fica fora das pastas dos usuários (listagens, watcher e sync não o veem) e no
+        mesmo filesystem do storage, então link/replace para o destino continuam atômicos.
+        """
+        return StorageService.get_system_directory('uploads') / f"{uuid.uuid4().hex}.{name}.{suffix}"
+
     @staticmethod
     def get_storage_info():
         """Retorna informações sobre o storage global (todos os usuários)"""
         storage_path = current_app.config['STORAGE_PATH']
         max_size = current_app.config['MAX_STORAGE_SIZE']
+
+        if current_app.config['QUOTA_ACCOUNTING'] == 'logical':
+            from app.services.file_index_service import FileIndexService
+            total_size, files_count = FileIndexService.get_total_usage(logical=True)
+            return {
+                'used': total_size,
+                'max': max_size,
+                'available': max_size - total_size,
+                'percentage': round((total_size / max_size) * 100, 2) if max_size > 0 else 0,
+                'files_count': files_count
+            }
         
         if not storage_path.exists():
             return {
@@ -55,6 +138,9 @@ class StorageService:
         files_count = 0
         
         for root, dirs, files in os.walk(storage_path):
+            if root == str(storage_path):
+                # .system guarda dados internos (índices, cache, versões, lixeira), não arquivos de usuários
+                dirs[:] = [d for d in dirs if d != '.system']
             for file in files:
                 file_path = Path(root) / file
                 if file_path.exists():
@@ -72,25 +158,12 @@ class StorageService:
     @staticmethod
     def get_user_storage_info(user_id):
         """Retorna informações sobre o storage de um usuário específico"""
-        user_dir = StorageService.get_user_directory(user_id)
-        max_user_size = current_app.config['MAX_USER_STORAGE_SIZE']
+        from app.services.file_index_service import FileIndexService
 
-        if not user_dir.exists():
-            return {
-                'used': 0,
-                'max': max_user_size,
-                'available': max_user_size,
-                'percentage': 0,
-                'files_count': 0
-            }
-
-        total_size = 0
-        files_count = 0
-
-        for file_path in user_dir.rglob('*'):
-            if file_path.is_file():
-                total_size += file_path.stat().st_size
-                files_count += 1
+        max_user_size = current_app.config['MAX_USER_STORAGE_SIZE']
+        # O índice de arquivos evita varrer a árvore do usuário a cada consulta
+        logical = current_app.config['QUOTA_ACCOUNTING'] == 'logical'
+        total_size, files_count = FileIndexService.get_usage(user_id, logical=logical)
 
         return {
             'used': total_size,
@@ -133,37 +206,60 @@ class StorageService:
         target.mkdir(parents=True, exist_ok=True)
         return target
 
+    @staticmethod
+    def to_user_relative(user_id, path):
+        """Converte um caminho absoluto dentro da pasta do usuário para relativo (POSIX)"""
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        relative = Path(path).resolve().relative_to(user_root).as_posix()
+        return '' if relative == '.' else relative
+
     @staticmethod
     def list_user_entries(user_id, relative_path: str = ""):
         """Lista arquivos e pastas do usuário no caminho fornecido"""
+        entries = list(StorageService.iter_user_entries(user_id, relative_path))
+        entries.sort(key=lambda e: (0 if e['type'] == 'dir' else 1, e['name'].lower()))
+        return entries
+
+    @staticmethod
+    def iter_user_entries(user_id, relative_path: str = ""):
+        """Gera as entradas de uma pasta na ordem do disco (os.scandir), sem montar a lista.
+
+        A pasta e os tamanhos lógicos são resolvidos já na chamada: caminho
+        inválido levanta ValueError antes de a resposta começar a ser enviada.
+        """
+        from app.models import FileEntry
+
         base_dir = StorageService.get_user_directory(user_id, relative_path)
 
-        entries = []
-        for item in base_dir.iterdir():
-            stat = item.stat()
-            if item.is_dir():
-                size = 0
-                for f in item.rglob('*'):
-                    if f.is_file():
-                        size += f.stat().st_size
-                entries.append({
-                    'type': 'dir',
-                    'name': item.name,
-                    'path': str(Path(relative_path) / item.name),
-                    'size': size,
-                    'modified_at': datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
-                })
-            else:
-                entries.append({
-                    'type': 'file',
-                    'name': item.name,
-                    'path': str(Path(relative_path) / item.name),
-                    'size': stat.st_size,
-                    'modified_at': datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
-                })
+        # Arquivos comprimidos em disco aparecem com o tamanho original
+        logical_sizes = dict(
+            FileEntry.query.with_entities(FileEntry.name, FileEntry.size).filter(
+                FileEntry.user_id == int(user_id),
+                FileEntry.parent == StorageService.to_user_relative(user_id, base_dir),
+                FileEntry.encoding.isnot(None)
+            )
+        )
+        base = str(Path(relative_path))
+        prefix = '' if base == '.' else base + os.sep
+        return StorageService._scan_entries(base_dir, prefix, logical_sizes)
 
-        entries.sort(key=lambda e: (0 if e['type'] == 'dir' else 1, e['name'].lower()))
-        return entries
+    @staticmethod
+    def _scan_entries(base_dir, prefix, logical_sizes):
+        with os.scandir(base_dir) as it:
+            for item in it:
+                try:
+                    stat = item.stat()
+                    is_dir = item.is_dir()
+                except FileNotFoundError:
+                    continue  # removido durante a listagem
+                name = item.name
+                yield {
+                    'type': 'dir' if is_dir else 'file',
+                    'name': name,
+                    'path': prefix + name,
+                    'size': _tree_size(item.path) if is_dir else logical_sizes.get(name, stat.st_size),
+                    'modified_at': format_timestamp(stat.st_mtime)
+                }
     
     @staticmethod
     def save_file(file, user_id, original_filename=None):
@@ -191,36 +287,218 @@ class StorageService:
         unique_hash = hashlib.md5(f"{user_id}_{timestamp}_{filename}".encode()).hexdigest()[:8]
         unique_filename = f"{timestamp}_{unique_hash}_{filename}"
         
-        # Salva o arquivo
+        # Salva o arquivo (comprimindo em streaming quando o tipo permite)
         user_dir = StorageService.get_user_directory(user_id)
         file_path = user_dir / unique_filename
+        encoding = compression.choose_encoding(filename, file_size)
         
         try:
-            file.save(str(file_path))
+            digest = hashlib.sha256()
+            stored_size = StorageService.write_stream(file.stream, file_path, encoding, digest=digest)
             print(f"✅ Arquivo salvo: {file_path}")
+            storage_events.emit(storage_events.CREATED, user_id, unique_filename,
+                                size=file_size, encoding=encoding, sha256=digest.hexdigest())
             return {
                 'filename': unique_filename,
                 'original_filename': original_filename,
                 'size': file_size,
+                'stored_size': stored_size,
+                'encoding': encoding,
+                'sha256': digest.hexdigest(),
                 'path': str(file_path.relative_to(current_app.config['STORAGE_PATH']))
             }, None
         except Exception as e:
             print(f"❌ Erro ao salvar arquivo: {e}")
+            file_path.unlink(missing_ok=True)
             return None, f'Erro ao salvar arquivo: {str(e)}'
+
+    @staticmethod
+    def write_stream(stream, file_path, encoding=None, chunk_size=compression.CHUNK_SIZE, digest=None):
+        """Grava um stream em disco em blocos (comprimindo se encoding); retorna os bytes gravados.
+
+        ``digest`` (ex.: hashlib.sha256()) é atualizado com o conteúdo original no mesmo passe.
+        """
+        with open(file_path, 'wb') as out:
+            writer = compression.open_writer(out, encoding)
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if digest is not None:
+                    digest.update(chunk)
+                writer.write(chunk)
+            writer.close()
+            return out.tell()
+
+    @staticmethod
+    def get_file_entry(user_id, relative_path):
+        """Metadados indexados de um arquivo (tamanho lógico, codificação) ou None"""
+        from app.models import FileEntry
+        return FileEntry.query.filter_by(
+            user_id=int(user_id), path=storage_events.to_relative(relative_path)
+        ).first()
     
+    @staticmethod
+    def resolve_user_path(user_id, relative_path='', user_root=None):
+        """Resolve um caminho relativo dentro da pasta do usuário sem criar nada.
+
+        ``user_root`` (já resolvido) evita recalcular a pasta do usuário em lotes.
+        """
+        if user_root is None:
+            user_root = StorageService.get_user_directory(user_id).resolve()
+        parts = [p for p in storage_events.to_relative(relative_path or '').split('/') if p and p != '..']
+        target = (user_root / Path(*parts)).resolve() if parts else user_root
+        if target != user_root and user_root not in target.parents:
+            raise ValueError("Caminho inválido")
+        return target
+
+    @staticmethod
+    def _resolve_or_fail(user_id, relative_path, user_root, message='Caminho inválido'):
+        try:
+            return StorageService.resolve_user_path(user_id, relative_path, user_root)
+        except ValueError:
+            raise StorageOperationError(message)
+
+    @staticmethod
+    def create_folder(user_id, relative_path, name, user_root=None):
+        """Cria uma pasta; retorna o caminho relativo criado"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        safe_name = secure_filename(name or '')
+        if not safe_name:
+            raise StorageOperationError('Nome inválido')
+
+        parent = StorageService._resolve_or_fail(user_id, relative_path, user_root)
+        folder = parent / safe_name
+        folder.mkdir(parents=True, exist_ok=True)
+        relative = folder.relative_to(user_root).as_posix()
+        storage_events.emit(storage_events.MKDIR, user_id, relative, is_dir=True)
+        return relative
+
+    @staticmethod
+    def create_empty_file(user_id, relative_path, name, user_root=None):
+        """Cria um arquivo vazio; retorna o caminho relativo criado"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        safe_name = secure_filename(name or '')
+        if not safe_name:
+            raise StorageOperationError('Nome inválido')
+
+        parent = StorageService._resolve_or_fail(user_id, relative_path, user_root)
+        parent.mkdir(parents=True, exist_ok=True)
+        file_path = parent / safe_name
+        try:
+            # 'x' falha se o arquivo já existe, sem corrida entre checar e criar
+            with open(file_path, 'x'):
+                pass
+        except FileExistsError:
+            raise StorageOperationError('Arquivo já existe')
+        relative = file_path.relative_to(user_root).as_posix()
+        storage_events.emit(storage_events.CREATED, user_id, relative, sha256=EMPTY_SHA256)
+        return relative
+
+    @staticmethod
+    def _prepare_transfer(user_id, source, target_path, user_root, new_name=None):
+        src = StorageService._resolve_or_fail(user_id, source, user_root)
+        if src == user_root or not src.exists():
+            raise StorageOperationError('Arquivo não encontrado', 404)
+        if src.is_dir():
+            raise StorageOperationError('Operação disponível apenas para arquivos')
+
+        dest_dir = StorageService._resolve_or_fail(user_id, target_path, user_root, 'Caminho de destino inválido')
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        name = secure_filename(new_name) if new_name else src.name
+        if not name:
+            raise StorageOperationError('Nome inválido')
+        dest = dest_dir / name
+        if dest.exists():
+            raise StorageOperationError('Arquivo de destino já existe')
+        return src, dest
+
+    @staticmethod
+    def move_file(user_id, source, target_path='', user_root=None):
+        """Move um arquivo para a pasta ``target_path``; retorna o novo caminho relativo"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        src, dest = StorageService._prepare_transfer(user_id, source, target_path, user_root)
+
+        src.replace(dest)
+        relative = dest.relative_to(user_root).as_posix()
+        storage_events.emit(storage_events.MOVED, user_id, src.relative_to(user_root).as_posix(),
+                            dest_path=relative)
+        return relative
+
+    @staticmethod
+    def entry_metadata(entry):
+        """Metadados de um arquivo indexado que uma cópia byte a byte preserva (info de evento)"""
+        if entry is None:
+            return {}
+        info = {'sha256': entry.sha256} if entry.sha256 else {}
+        if entry.encoding:
+            info.update(size=entry.size, encoding=entry.encoding)
+        return info
+
+    @staticmethod
+    def accounted_size(entry, fallback_size):
+        """Bytes que um arquivo indexado conta na cota (lógicos ou em disco, conforme QUOTA_ACCOUNTING)"""
+        if entry is None:
+            return fallback_size
+        return StorageService.accounted_bytes(entry.size, entry.stored_size)
+
+    @staticmethod
+    def accounted_bytes(size, stored_size):
+        """Escolhe entre tamanho lógico e em disco conforme QUOTA_ACCOUNTING"""
+        return size if current_app.config['QUOTA_ACCOUNTING'] == 'logical' else stored_size
+
+    @staticmethod
+    def copy_file(user_id, source, target_path='', user_root=None, new_name=None):
+        """Copia um arquivo no servidor (reflink/copy_file_range quando possível).
+
+        Retorna o caminho relativo da cópia.
+        """
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        src, dest = StorageService._prepare_transfer(user_id, source, target_path, user_root, new_name)
+
+        # Cota verificada pelo índice, sem varrer o disco
+        entry = StorageService.get_file_entry(user_id, src.relative_to(user_root).as_posix())
+        if not StorageService.has_space_available(StorageService.accounted_size(entry, src.stat().st_size), user_id):
+            raise StorageOperationError('Espaço de armazenamento esgotado')
+
+        # Copia os bytes armazenados: arquivos comprimidos continuam comprimidos
+        try:
+            method = fast_copy.copy_file(src, dest)
+        except FileExistsError:
+            raise StorageOperationError('Arquivo de destino já existe')
+        except Exception:
+            dest.unlink(missing_ok=True)
+            raise
+        print(f"📄 Arquivo copiado ({method}): {src} -> {dest}")
+
+        relative = dest.relative_to(user_root).as_posix()
+        storage_events.emit(storage_events.CREATED, user_id, relative, **StorageService.entry_metadata(entry))
+        return relative
+
+    @staticmethod
+    def delete_path(user_id, relative_path, user_root=None):
+        """Remove um arquivo; retorna o caminho relativo removido"""
+        user_root = user_root or StorageService.get_user_directory(user_id).resolve()
+        file_path = StorageService._resolve_or_fail(user_id, relative_path, user_root)
+        if file_path == user_root or not file_path.exists():
+            raise StorageOperationError('Arquivo não encontrado', 404)
+        if file_path.is_dir():
+            raise StorageOperationError('Operação disponível apenas para arquivos')
+
+        file_path.unlink()
+        print(f"🗑️ Arquivo deletado: {file_path}")
+        relative = file_path.relative_to(user_root).as_posix()
+        storage_events.emit(storage_events.DELETED, user_id, relative)
+        return relative
+
     @staticmethod
     def delete_file(user_id, filename):
         """Remove um arquivo do storage"""
-        user_dir = StorageService.get_user_directory(user_id)
-        file_path = user_dir / filename
-        
-        if not file_path.exists():
-            return False, 'Arquivo não encontrado'
-        
         try:
-            file_path.unlink()
-            print(f"🗑️ Arquivo deletado: {file_path}")
+            StorageService.delete_path(user_id, filename)
             return True, 'Arquivo deletado com sucesso'
+        except StorageOperationError as e:
+            return False, e.message
         except Exception as e:
             print(f"❌ Erro ao deletar arquivo: {e}")
             return False, f'Erro ao deletar arquivo: {str(e)}'
@@ -244,14 +522,17 @@ class StorageService:
             return []
         
         files = []
-        for file_path in user_dir.iterdir():
-            if file_path.is_file():
-                stat = file_path.stat()
-                files.append({
-                    'filename': file_path.name,
-                    'size': stat.st_size,
-                    'created_at': datetime.datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    'modified_at': datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
-                })
-        
-        return sorted(files, key=lambda x: x['created_at'], reverse=True)
+        with os.scandir(user_dir) as it:
+            for item in it:
+                if item.is_file():
+                    stat = item.stat()
+                    files.append((stat.st_ctime_ns, {
+                        'filename': item.name,
+                        'size': stat.st_size,
+                        'created_at': format_timestamp(stat.st_ctime),
+                        'modified_at': format_timestamp(stat.st_mtime)
+                    }))
+
+        # Ordena pelo timestamp numérico em vez de comparar as strings formatadas
+        files.sort(key=lambda item: item[0], reverse=True)
+        return [info for _, info in files]
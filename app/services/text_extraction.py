@@ -0,0 +1,102 @@
+import html
+import re
+import zipfile
+from pathlib import Path
+from app.services.compression import open_reader
+
+try:
+    from pypdf import PdfReader  # opcional: extração de texto de PDFs
+except ImportError:
+    PdfReader = None
+
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.csv', '.tsv', '.json', '.log', '.xml', '.yaml', '.yml', '.ini', '.cfg',
+    '.py', '.js', '.ts', '.java', '.c', '.h', '.cpp', '.cs', '.go', '.rb', '.php', '.sql', '.sh',
+    '.css', '.rtf', '.tex',
+}
+HTML_EXTENSIONS = {'.html', '.htm'}
+
+# Arquivos (ZIP + XML) de onde sai o texto de cada formato office
+OFFICE_MEMBERS = {
+    '.docx': re.compile(r'^word/(document|header\d*|footer\d*)\.xml$'),
+    '.xlsx': re.compile(r'^xl/sharedStrings\.xml$'),
+    '.pptx': re.compile(r'^ppt/slides/slide\d+\.xml$'),
+    '.odt': re.compile(r'^content\.xml$'),
+    '.ods': re.compile(r'^content\.xml$'),
+    '.odp': re.compile(r'^content\.xml$'),
+}
+
+# Tamanho descompactado máximo de um XML interno (o cabeçalho do ZIP pode mentir,
+# então a leitura também é limitada): evita que um zip bomb esgote a memória
+OFFICE_MEMBER_MAX_SIZE = 64 * 1024 * 1024
+# Bytes de XML lidos por caractere de texto ainda desejado (marcação ocupa a maior parte)
+MARKUP_RATIO = 4
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_SCRIPT_RE = re.compile(r'<(script|style)\b.*?</\1>', re.IGNORECASE | re.DOTALL)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def is_extractable(path) -> bool:
+    suffix = Path(path).suffix.lower()
+    return (suffix in TEXT_EXTENSIONS or suffix in HTML_EXTENSIONS or suffix in OFFICE_MEMBERS
+            or (suffix == '.pdf' and PdfReader is not None))
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _strip_markup(markup: str) -> str:
+    text = _TAG_RE.sub(' ', _SCRIPT_RE.sub(' ', markup))
+    return _SPACE_RE.sub(' ', html.unescape(text)).strip()
+
+
+def extract_text(path, max_size: int, encoding=None) -> str:
+    """Extrai até max_size caracteres de texto do arquivo ('' se o formato não é suportado).
+
+    ``encoding`` indica compressão em repouso (gzip/zstd) do arquivo em disco.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix in TEXT_EXTENSIONS:
+        with open_reader(path, encoding) as fh:
+            return _decode(fh.read(max_size))
+
+    if suffix in HTML_EXTENSIONS:
+        with open_reader(path, encoding) as fh:
+            return _strip_markup(_decode(fh.read(max_size * 2)))[:max_size]
+
+    if suffix in OFFICE_MEMBERS:
+        pattern = OFFICE_MEMBERS[suffix]
+        parts = []
+        remaining = max_size
+        with zipfile.ZipFile(path) as archive:
+            for info in sorted(archive.infolist(), key=lambda item: item.filename):
+                if remaining <= 0:
+                    break
+                if not pattern.match(info.filename) or info.file_size > OFFICE_MEMBER_MAX_SIZE:
+                    continue
+                with archive.open(info) as member:
+                    data = member.read(min(remaining * MARKUP_RATIO, OFFICE_MEMBER_MAX_SIZE))
+                text = _strip_markup(_decode(data))[:remaining]
+                parts.append(text)
+                remaining -= len(text)
+        return ' '.join(parts)
+
+    if suffix == '.pdf' and PdfReader is not None:
+        parts = []
+        remaining = max_size
+        for page in PdfReader(str(path)).pages:
+            if remaining <= 0:
+                break
+            text = (page.extract_text() or '')[:remaining]
+            parts.append(text)
+            remaining -= len(text)
+        return ' '.join(parts)
+
+    return ''
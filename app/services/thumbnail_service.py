@@ -0,0 +1,208 @@
+import datetime
+import functools
+import hashlib
+import os
+import threading
+from pathlib import Path
+from flask import current_app
+from app.services.executors import LazyExecutor
+from app.services.storage_service import StorageService
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow é opcional: sem ele não há thumbnails
+    Image = None
+
+try:
+    import fitz  # PyMuPDF, opcional: pré-visualização da primeira página de PDFs
+except ImportError:
+    fitz = None
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+
+_executor = LazyExecutor('THUMBNAIL_WORKERS', 'thumbnails')
+# Tamanho do cache mantido em memória: só varre o diretório na 1ª vez e ao estourar o limite
+_cache_size = None
+_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_content_hash(path, size, mtime_ns):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailService:
+    """Gera e serve thumbnails/pré-visualizações em cache derivado (por hash do conteúdo)"""
+
+    @staticmethod
+    def is_supported(file_path):
+        suffix = Path(file_path).suffix.lower()
+        if suffix in IMAGE_EXTENSIONS:
+            return Image is not None
+        if suffix in PDF_EXTENSIONS:
+            return Image is not None and fitz is not None
+        return False
+
+    @staticmethod
+    def content_hash(file_path, user_id=None):
+        """SHA-256 do conteúdo: o do índice quando ainda corresponde ao arquivo em disco;
+        senão é calculado e memorizado por (caminho, tamanho, mtime)"""
+        stat = os.stat(file_path)
+        if user_id is not None:
+            indexed = ThumbnailService._indexed_hash(user_id, file_path, stat)
+            if indexed:
+                return indexed
+        return _cached_content_hash(str(file_path), stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _indexed_hash(user_id, file_path, stat):
+        try:
+            relative = StorageService.to_user_relative(user_id, file_path)
+        except ValueError:
+            return None
+        entry = StorageService.get_file_entry(user_id, relative)
+        if entry is None or not entry.sha256 or entry.corrupt or entry.modified_at is None:
+            return None
+        # Alterado fora da aplicação desde a indexação: o checksum não vale mais
+        mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
+        if entry.stored_size != stat.st_size or abs((entry.modified_at - mtime).total_seconds()) >= 1:
+            return None
+        return entry.sha256
+
+    @staticmethod
+    def get_cache_path(content_hash, size_name):
+        cache_dir = StorageService.get_system_directory('thumbnails') / content_hash[:2]
+        return cache_dir / f"{content_hash}_{size_name}.jpg"
+
+    @staticmethod
+    def _load_image(file_path):
+        if Path(file_path).suffix.lower() in PDF_EXTENSIONS:
+            with fitz.open(str(file_path)) as document:
+                pixmap = document.load_page(0).get_pixmap()
+                return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        image = Image.open(file_path)
+        image.load()
+        return image
+
+    @staticmethod
+    def generate(file_path, size_names=None, user_id=None):
+        """Gera os thumbnails (todos os tamanhos por padrão); retorna o hash do conteúdo"""
+        sizes = current_app.config['THUMBNAIL_SIZES']
+        content_hash = ThumbnailService.content_hash(file_path, user_id)
+        pending = [name for name in (size_names or sizes)
+                   if not ThumbnailService.get_cache_path(content_hash, name).exists()]
+        if not pending:
+            return content_hash
+
+        source = ThumbnailService._load_image(file_path)
+        if source.mode not in ('RGB', 'L'):
+            source = source.convert('RGB')
+
+        written = 0
+        for size_name in pending:
+            pixels = sizes[size_name]
+            thumbnail = source.copy()
+            thumbnail.thumbnail((pixels, pixels))
+            target = ThumbnailService.get_cache_path(content_hash, size_name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            thumbnail.save(tmp_path, format='JPEG', quality=85)
+            written += os.path.getsize(tmp_path)
+            os.replace(tmp_path, target)
+
+        ThumbnailService._account(written)
+        return content_hash
+
+    @staticmethod
+    def _get_executor():
+        return _executor.get()
+
+    @staticmethod
+    def schedule(file_path, user_id=None):
+        """Agenda a geração dos thumbnails fora do caminho da requisição"""
+        if not file_path or not ThumbnailService.is_supported(file_path):
+            return
+
+        app = current_app._get_current_object()
+
+        def job():
+            with app.app_context():
+                try:
+                    ThumbnailService.generate(file_path, user_id=user_id)
+                except Exception as e:
+                    print(f"❌ Erro ao gerar thumbnail de {file_path}: {e}")
+
+        ThumbnailService._get_executor().submit(job)
+
+    @staticmethod
+    def get_thumbnail(file_path, size_name, user_id=None):
+        """Retorna (caminho do thumbnail, hash); gera sob demanda em caso de cache miss"""
+        if not ThumbnailService.is_supported(file_path):
+            return None, None
+
+        content_hash = ThumbnailService.content_hash(file_path, user_id)
+        cache_path = ThumbnailService.get_cache_path(content_hash, size_name)
+        if not cache_path.exists():
+            ThumbnailService.generate(file_path, [size_name], user_id)
+        else:
+            # mtime funciona como "último acesso" para a remoção LRU
+            os.utime(cache_path)
+        return cache_path, content_hash
+
+    @staticmethod
+    def _account(nbytes):
+        """Soma os bytes gerados ao tamanho do cache e limpa quando passa do limite"""
+        global _cache_size
+        with _cache_lock:
+            if _cache_size is None:
+                _cache_size = ThumbnailService._scan_cache()[1]
+            _cache_size += nbytes
+            over_limit = _cache_size > current_app.config['THUMBNAIL_CACHE_MAX_SIZE']
+        if over_limit:
+            ThumbnailService.enforce_cache_limit()
+
+    @staticmethod
+    def _scan_cache():
+        """Retorna ([(mtime, tamanho, caminho)], total) dos arquivos do cache"""
+        cache_dir = StorageService.get_system_directory('thumbnails')
+        entries = []
+        total_size = 0
+        for root, dirs, files in os.walk(cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+        return entries, total_size
+
+    @staticmethod
+    def enforce_cache_limit():
+        """Remove os thumbnails menos usados até o cache caber no limite configurado"""
+        global _cache_size
+        max_size = current_app.config['THUMBNAIL_CACHE_MAX_SIZE']
+        entries, total_size = ThumbnailService._scan_cache()
+        if total_size <= max_size:
+            with _cache_lock:
+                _cache_size = total_size
+            return
+
+        # Libera até 90% do limite para não rodar a limpeza a cada geração
+        target_size = max_size * 0.9
+        for mtime, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except FileNotFoundError:
+                pass
+        with _cache_lock:
+            _cache_size = total_size
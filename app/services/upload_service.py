@@ -0,0 +1,236 @@
+import hashlib
+import os
+from flask import current_app
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+from app.services import compression
+from app.services import storage_events
+from app.services.storage_service import StorageService, StorageOperationError
+
+READ_SIZE = 256 * 1024
+FIELD_MAX_SIZE = 4096
+
+
+class _PartWriter:
+    """Grava uma parte do multipart em um arquivo temporário conforme os bytes chegam.
+
+    O tamanho de cada parte não é conhecido de antemão, então a compressão só é
+    decidida depois dos primeiros COMPRESSION_MIN_SIZE bytes (ou do fim da parte).
+    """
+
+    def __init__(self, staging, filename):
+        config = current_app.config
+        self.staging = staging
+        self.filename = filename
+        self.max_size = config['MAX_FILE_SIZE']
+        self.threshold = config['COMPRESSION_MIN_SIZE'] if config.get('COMPRESSION_ENABLED') else 0
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.encoding = None
+        self.head = bytearray()
+        self.out = None
+        self.writer = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise StorageOperationError(
+                f'Arquivo muito grande. Máximo permitido: {self.max_size / (1024*1024):.0f}MB', 413)
+        self.digest.update(data)
+        if self.writer is not None:
+            self.writer.write(data)
+            return
+        self.head += data
+        if len(self.head) >= self.threshold:
+            self._open()
+
+    def _open(self):
+        self.encoding = compression.choose_encoding(self.filename, len(self.head))
+        self.out = open(self.staging, 'xb')
+        self.writer = compression.open_writer(self.out, self.encoding)
+        if self.head:
+            self.writer.write(bytes(self.head))
+            self.head = bytearray()
+
+    def finish(self):
+        """Fecha o arquivo temporário; retorna os bytes gravados em disco"""
+        if self.writer is None:
+            self._open()
+        self.writer.close()
+        stored_size = self.out.tell()
+        self.out.close()
+        return stored_size
+
+    def abort(self):
+        if self.out is not None:
+            self.out.close()
+        self.staging.unlink(missing_ok=True)
+
+
+class UploadService:
+    """Upload de vários arquivos numa única requisição multipart, lida em streaming"""
+
+    @staticmethod
+    def _split_filename(filename):
+        """Separa o caminho relativo enviado no filename (ex.: webkitRelativePath) em partes seguras"""
+        parts = [secure_filename(p) for p in filename.replace('\\', '/').split('/')]
+        return [p for p in parts if p]
+
+    @staticmethod
+    def _ensure_folders(user_id, base, folders, user_root, created):
+        """Cria as pastas intermediárias, emitindo MKDIR apenas para as novas"""
+        current = base
+        for name in folders:
+            current = current / name
+            if current in created:
+                continue
+            try:
+                current.mkdir()
+                storage_events.emit(storage_events.MKDIR, user_id,
+                                    current.relative_to(user_root).as_posix(), is_dir=True)
+            except FileExistsError:
+                if not current.is_dir():
+                    raise StorageOperationError(f'{name} já existe e não é uma pasta', 409)
+            created.add(current)
+        return current
+
+    @staticmethod
+    def _publish(staging, target):
+        """Coloca o arquivo no destino sem sobrescrever; em conflito usa nome_1.ext, nome_2.ext..."""
+        stem, suffix = os.path.splitext(target.name)
+        for attempt in range(1000):
+            candidate = target if attempt == 0 else target.with_name(f"{stem}_{attempt}{suffix}")
+            try:
+                # link falha se o destino existe: sem corrida entre checar e gravar
+                os.link(staging, candidate)
+            except FileExistsError:
+                continue
+            except OSError:
+                # Filesystem sem hard links
+                if candidate.exists():
+                    continue
+                staging.replace(candidate)
+                return candidate
+            staging.unlink()
+            return candidate
+        raise StorageOperationError('Não foi possível definir um nome livre para o arquivo', 409)
+
+    @staticmethod
+    def save_multipart(stream, boundary, user_id, declared_size):
+        """Lê um corpo multipart/form-data gravando cada arquivo em disco conforme chega.
+
+        O campo ``path`` (pasta de destino) deve vir antes dos arquivos; o filename de
+        cada parte pode conter subpastas, que são recriadas. Retorna (resultados, erro):
+        um resultado por arquivo e um erro geral se a leitura do corpo falhou no meio.
+        """
+        config = current_app.config
+        # Uma única verificação de cota para o corpo inteiro (limite superior do que será gravado)
+        if not StorageService.has_space_available(declared_size, user_id):
+            max_user_gb = config['MAX_USER_STORAGE_SIZE'] / (1024*1024*1024)
+            raise StorageOperationError(
+                f'Espaço de armazenamento esgotado (limite de {max_user_gb:.0f}GB por usuário)', 413)
+
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        decoder = MultipartDecoder(boundary)
+        max_files = config['UPLOAD_MAX_FILES']
+        fields = {}
+        base = None
+        created = set()
+        results = []
+
+        field_name = None
+        writer = None
+        target = None
+        result = None
+
+        def finish_part():
+            stored_size = writer.finish()
+            final = UploadService._publish(writer.staging, target)
+            relative = final.relative_to(user_root).as_posix()
+            checksum = writer.digest.hexdigest()
+            storage_events.emit(storage_events.CREATED, user_id, relative,
+                                size=writer.size, encoding=writer.encoding, sha256=checksum)
+            result.update({
+                'success': True,
+                'path': relative,
+                'size': writer.size,
+                'stored_size': stored_size,
+                'encoding': writer.encoding,
+                'sha256': checksum
+            })
+
+        def start_part(filename):
+            nonlocal base
+            if base is None:
+                base = StorageService._resolve_or_fail(user_id, fields.get('path', ''), user_root)
+                base.mkdir(parents=True, exist_ok=True)
+            parts = UploadService._split_filename(filename)
+            if not parts:
+                raise StorageOperationError('Nome inválido')
+            if len(results) > max_files:
+                raise StorageOperationError(f'Limite de {max_files} arquivos por requisição excedido', 413)
+            parent = UploadService._ensure_folders(user_id, base, parts[:-1], user_root, created)
+            staging = StorageService.get_staging_path(parts[-1])
+            return parent / parts[-1], _PartWriter(staging, parts[-1])
+
+        def fail_part(message):
+            nonlocal writer
+            if writer is not None:
+                writer.abort()
+                writer = None
+            result.update({'success': False, 'message': message})
+
+        try:
+            finished = False
+            while not finished:
+                data = stream.read(READ_SIZE)
+                decoder.receive_data(data or None)
+                event = decoder.next_event()
+                while not isinstance(event, NeedData):
+                    if isinstance(event, Epilogue):
+                        finished = True
+                        break
+                    if isinstance(event, Field):
+                        field_name = event.name
+                        fields[field_name] = ''
+                    elif isinstance(event, File):
+                        field_name = None
+                        result = {'filename': event.filename}
+                        results.append(result)
+                        try:
+                            target, writer = start_part(event.filename)
+                        except StorageOperationError as e:
+                            if base is None:
+                                raise  # pasta de destino inválida: nada foi gravado
+                            fail_part(e.message)
+                    elif isinstance(event, Data):
+                        if field_name is not None:
+                            if len(fields[field_name]) < FIELD_MAX_SIZE:
+                                fields[field_name] += event.data.decode('utf-8', 'replace')
+                        elif writer is not None:
+                            try:
+                                writer.write(event.data)
+                                if not event.more_data:
+                                    finish_part()
+                                    writer = None
+                            except StorageOperationError as e:
+                                fail_part(e.message)
+                    event = decoder.next_event()
+                if not data and not finished:
+                    break
+        except ValueError:
+            # Corpo malformado: o que já foi concluído continua salvo
+            if writer is not None:
+                fail_part('Upload interrompido')
+            return results, 'Corpo multipart inválido'
+        except Exception:
+            # Cliente desconectou, pasta de destino inválida ou erro de disco: não deixa o temporário
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if not finished:
+            if writer is not None:
+                fail_part('Upload interrompido')
+            return results, 'Corpo multipart incompleto'
+        return results, None
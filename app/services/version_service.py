@@ -0,0 +1,453 @@
+import datetime
+import hashlib
+import os
+import posixpath
+import threading
+import uuid
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import Chunk, FileVersion, FileVersionChunk
+from app.services import chunking
+from app.services import compression
+from app.services import fast_copy
+from app.services import storage_events
+from app.services.executors import LazyExecutor
+from app.services.file_index_service import _escape_like
+from app.services.storage_service import StorageService, StorageOperationError
+
+_executor = LazyExecutor('VERSION_WORKERS', 'versions')
+
+
+def _version_subtree(user_id, path):
+    return (FileVersion.user_id == user_id) & or_(
+        FileVersion.path == path,
+        FileVersion.path.like(f"{_escape_like(path)}/%", escape='\\')
+    )
+
+
+class VersionService:
+    """Versões anteriores de arquivos, guardadas em um chunk store deduplicado.
+
+    Ao substituir um arquivo, o conteúdo atual vai (por hard link, instantâneo) para
+    ``.system/versions`` e um worker o divide em chunks por conteúdo (CDC). Só os
+    chunks que ainda não existem no store ocupam espaço novo; versões antigas são
+    removidas pela política de retenção e chunks sem referência são apagados.
+    """
+
+    @staticmethod
+    def init_app(app):
+        storage_events.subscribe(VersionService._on_storage_event)
+        app.cli.add_command(prune_versions_command)
+
+    @staticmethod
+    def _get_executor():
+        return _executor.get()
+
+    @staticmethod
+    def get_chunk_path(digest):
+        return StorageService.get_system_directory('chunks') / digest[:2] / digest[2:4] / digest
+
+    @staticmethod
+    def get_pending_path(version_id):
+        return StorageService.get_system_directory('versions') / str(version_id)
+
+    # --- eventos ---------------------------------------------------------------
+
+    @staticmethod
+    def _on_storage_event(action, user_id, path, dest_path=None, is_dir=False, **info):
+        user_id = int(user_id)
+        if action == storage_events.MOVED:
+            versions = FileVersion.query.filter(_version_subtree(user_id, path)).all()
+            for version in versions:
+                version.path = dest_path + version.path[len(path):]
+            if versions:
+                db.session.commit()
+        elif action == storage_events.DELETED:
+            # O histórico acompanha o arquivo: excluído o arquivo, as versões vão junto
+            versions = FileVersion.query.filter(_version_subtree(user_id, path)).all()
+            if versions:
+                VersionService._delete_versions(versions)
+                # A coleta varre todos os chunks órfãos: fica fora do caminho da requisição
+                VersionService.schedule_garbage_collection()
+
+    # --- criação de versões ----------------------------------------------------
+
+    @staticmethod
+    def replace_file(file, user_id, relative_path):
+        """Substitui o conteúdo de um arquivo existente, guardando o atual como versão.
+
+        Retorna o dict do arquivo salvo (como ``save_file``) com ``previous_version``.
+        """
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        try:
+            target = StorageService.resolve_user_path(user_id, relative_path, user_root)
+        except ValueError:
+            raise StorageOperationError('Caminho inválido')
+        if target == user_root or not target.is_file():
+            raise StorageOperationError('Arquivo não encontrado', 404)
+        relative = target.relative_to(user_root).as_posix()
+
+        max_file_size = current_app.config['MAX_FILE_SIZE']
+        file.seek(0, 2)
+        file_size = file.tell()
+        file.seek(0)
+        if file_size > max_file_size:
+            raise StorageOperationError(f'Arquivo muito grande. Máximo permitido: {max_file_size / (1024*1024):.0f}MB')
+
+        entry = StorageService.get_file_entry(user_id, relative)
+        current_size = StorageService.accounted_size(entry, target.stat().st_size)
+        encoding = compression.choose_encoding(target.name, file_size)
+        VersionService._check_quota(user_id, file_size, encoding, current_size)
+
+        # Grava em .system/uploads e troca por rename: leitores nunca veem o arquivo pela metade
+        staging = StorageService.get_staging_path(target.name)
+        digest = hashlib.sha256()
+        try:
+            stored_size = StorageService.write_stream(file.stream, staging, encoding, digest=digest)
+            VersionService._check_quota(user_id, file_size, encoding, current_size, stored_size)
+        except Exception:
+            staging.unlink(missing_ok=True)
+            raise
+
+        version = None
+        if current_app.config['VERSIONING_ENABLED']:
+            version = VersionService._snapshot(user_id, relative, target, entry)
+        staging.replace(target)
+        print(f"✅ Nova versão salva: {target}")
+
+        storage_events.emit(storage_events.CREATED, user_id, relative, size=file_size, encoding=encoding,
+                            sha256=digest.hexdigest())
+        if version is not None:
+            VersionService.schedule_store(version.id)
+
+        return {
+            'filename': target.name,
+            'original_filename': file.filename,
+            'size': file_size,
+            'stored_size': stored_size,
+            'encoding': encoding,
+            'sha256': digest.hexdigest(),
+            'path': relative,
+            'previous_version': VersionService.to_dict(version) if version else None
+        }
+
+    @staticmethod
+    def _check_quota(user_id, size, encoding, current_size, stored_size=None):
+        """Confere se trocar um conteúdo de ``current_size`` por um novo cabe na cota.
+
+        ``current_size`` vem de ``accounted_size``; o novo conteúdo é medido na
+        mesma unidade. Com contagem física e compressão, o tamanho em disco só é
+        conhecido depois de gravar: a checagem antes da gravação é pulada e a
+        chamada com ``stored_size`` decide.
+        """
+        if stored_size is None:
+            if encoding and current_app.config['QUOTA_ACCOUNTING'] != 'logical':
+                return
+            stored_size = size
+        incoming = StorageService.accounted_bytes(size, stored_size)
+        if not StorageService.has_space_available(incoming - current_size, user_id):
+            max_user_gb = current_app.config['MAX_USER_STORAGE_SIZE'] / (1024*1024*1024)
+            raise StorageOperationError(
+                f'Espaço de armazenamento esgotado (limite de {max_user_gb:.0f}GB por usuário)', 413)
+
+    @staticmethod
+    def _snapshot(user_id, relative, target, entry=None):
+        """Guarda o conteúdo atual na área de versões pendentes (hard link, sem cópia).
+
+        O chamador troca o arquivo em seguida com ``replace``: como o conteúdo antigo
+        continua ligado à versão, o caminho nunca fica sem arquivo.
+        """
+        version = FileVersion(
+            user_id=int(user_id),
+            path=relative,
+            size=entry.size if entry is not None else target.stat().st_size,
+            status='pending',
+            encoding=entry.encoding if entry is not None else None,
+            created_at=datetime.datetime.now()
+        )
+        db.session.add(version)
+        db.session.commit()
+        pending = VersionService.get_pending_path(version.id)
+        try:
+            os.link(target, pending)
+        except OSError:
+            fast_copy.copy_file(target, pending)
+        return version
+
+    @staticmethod
+    def schedule_store(version_id):
+        app = current_app._get_current_object()
+
+        def job():
+            with app.app_context():
+                try:
+                    VersionService.store_version(version_id)
+                except Exception as e:
+                    print(f"❌ Erro ao armazenar versão {version_id}: {e}")
+
+        VersionService._get_executor().submit(job)
+
+    @staticmethod
+    def schedule_garbage_collection():
+        app = current_app._get_current_object()
+
+        def job():
+            with app.app_context():
+                try:
+                    VersionService.collect_garbage()
+                except Exception as e:
+                    print(f"❌ Erro na coleta de chunks: {e}")
+
+        VersionService._get_executor().submit(job)
+
+    @staticmethod
+    def store_version(version_id, retries=3):
+        """Divide uma versão pendente em chunks e grava só os que faltam no store"""
+        version = db.session.get(FileVersion, version_id)
+        if version is None or version.status != 'pending':
+            return False
+        pending = VersionService.get_pending_path(version_id)
+
+        encoding = version.encoding
+        for attempt in range(retries):
+            created = set()
+            try:
+                for seq, data in enumerate(VersionService._iter_pending_chunks(pending, encoding)):
+                    digest = chunking.chunk_hash(data)
+                    if VersionService._add_chunk_reference(digest, data):
+                        created.add(digest)
+                    db.session.add(FileVersionChunk(version_id=version_id, seq=seq, chunk_hash=digest))
+                version.status = 'stored'
+                version.encoding = None
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Outro processo inseriu o mesmo chunk ao mesmo tempo: refaz a versão
+                db.session.rollback()
+                version = db.session.get(FileVersion, version_id)
+                if attempt == retries - 1:
+                    raise
+
+        # Uma coleta concorrente pode ter tirado do lugar um chunk recriado por nós
+        # antes do commit; a linha agora está confirmada, então basta regravar o que falta
+        missing = {digest for digest in created if not VersionService.get_chunk_path(digest).exists()}
+        if missing:
+            for data in VersionService._iter_pending_chunks(pending, encoding):
+                digest = chunking.chunk_hash(data)
+                if digest in missing:
+                    VersionService._write_chunk(digest, data)
+                    missing.discard(digest)
+
+        pending.unlink(missing_ok=True)
+        VersionService.prune(version.user_id, version.path)
+        return True
+
+    @staticmethod
+    def _iter_pending_chunks(pending, encoding):
+        config = current_app.config
+        with compression.open_reader(pending, encoding) as reader:
+            yield from chunking.iter_chunks(reader, config['VERSION_CHUNK_MIN_SIZE'],
+                                            config['VERSION_CHUNK_AVG_SIZE'], config['VERSION_CHUNK_MAX_SIZE'])
+
+    @staticmethod
+    def _write_chunk(digest, data):
+        chunk_path = VersionService.get_chunk_path(digest)
+        chunk_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = chunk_path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        tmp.replace(chunk_path)
+
+    @staticmethod
+    def _add_chunk_reference(digest, data):
+        """Incrementa a referência do chunk ou o cria; retorna True quando a linha é nova"""
+        updated = db.session.execute(
+            update(Chunk).where(Chunk.hash == digest).values(refcount=Chunk.refcount + 1)
+        ).rowcount
+        if updated:
+            return False
+        # Sem linha, o arquivo pode ser sobra de uma coleta em andamento: sempre regrava
+        VersionService._write_chunk(digest, data)
+        db.session.add(Chunk(hash=digest, size=len(data), refcount=1))
+        db.session.flush()
+        return True
+
+    # --- leitura ---------------------------------------------------------------
+
+    @staticmethod
+    def list_versions(user_id, relative_path):
+        path = storage_events.to_relative(relative_path)
+        versions = FileVersion.query.filter_by(user_id=int(user_id), path=path).order_by(
+            FileVersion.created_at.desc(), FileVersion.id.desc()
+        ).all()
+        return [VersionService.to_dict(version) for version in versions]
+
+    @staticmethod
+    def get_version(user_id, version_id):
+        version = db.session.get(FileVersion, version_id)
+        if version is None or version.user_id != int(user_id):
+            return None
+        return version
+
+    @staticmethod
+    def iter_content(version, block_size=compression.CHUNK_SIZE):
+        """Gera o conteúdo da versão remontando os chunks em streaming"""
+        if version.status == 'pending':
+            yield from compression.iter_decompressed(VersionService.get_pending_path(version.id),
+                                                     version.encoding, block_size)
+            return
+
+        hashes = db.session.query(FileVersionChunk.chunk_hash).filter(
+            FileVersionChunk.version_id == version.id
+        ).order_by(FileVersionChunk.seq).yield_per(1000)
+        for (digest,) in hashes:
+            with open(VersionService.get_chunk_path(digest), 'rb') as fh:
+                yield fh.read()
+
+    @staticmethod
+    def restore(user_id, version_id):
+        """Volta o arquivo para o conteúdo de uma versão (o atual vira uma nova versão)"""
+        version = VersionService.get_version(user_id, version_id)
+        if version is None:
+            raise StorageOperationError('Versão não encontrada', 404)
+
+        user_root = StorageService.get_user_directory(user_id).resolve()
+        target = user_root / version.path
+        name = posixpath.basename(version.path)
+        encoding = compression.choose_encoding(name, version.size)
+        entry, current_size = None, 0
+        if target.is_file():
+            entry = StorageService.get_file_entry(user_id, version.path)
+            current_size = StorageService.accounted_size(entry, target.stat().st_size)
+        VersionService._check_quota(user_id, version.size, encoding, current_size)
+
+        staging = StorageService.get_staging_path(name, 'restore')
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        try:
+            with open(staging, 'wb') as out:
+                writer = compression.open_writer(out, encoding)
+                for block in VersionService.iter_content(version):
+                    digest.update(block)
+                    writer.write(block)
+                writer.close()
+            VersionService._check_quota(user_id, version.size, encoding, current_size, staging.stat().st_size)
+        except Exception:
+            staging.unlink(missing_ok=True)
+            raise
+
+        snapshot = None
+        if target.is_file():
+            snapshot = VersionService._snapshot(user_id, version.path, target, entry)
+        staging.replace(target)
+
+        storage_events.emit(storage_events.CREATED, user_id, version.path, size=version.size, encoding=encoding,
+                            sha256=digest.hexdigest())
+        if snapshot is not None:
+            VersionService.schedule_store(snapshot.id)
+        return version.path
+
+    # --- retenção e GC -----------------------------------------------------------
+
+    @staticmethod
+    def _delete_versions(versions):
+        """Remove versões e decrementa as referências dos chunks (sem apagar chunks)"""
+        for version in versions:
+            counts = db.session.query(FileVersionChunk.chunk_hash, func.count()).filter(
+                FileVersionChunk.version_id == version.id
+            ).group_by(FileVersionChunk.chunk_hash).all()
+            for digest, count in counts:
+                db.session.execute(
+                    update(Chunk).where(Chunk.hash == digest).values(refcount=Chunk.refcount - count)
+                )
+            db.session.execute(delete(FileVersionChunk).where(FileVersionChunk.version_id == version.id))
+            if version.status == 'pending':
+                VersionService.get_pending_path(version.id).unlink(missing_ok=True)
+            db.session.delete(version)
+        db.session.commit()
+
+    @staticmethod
+    def prune(user_id=None, path=None):
+        """Aplica a retenção (quantidade por arquivo e idade); retorna versões removidas"""
+        config = current_app.config
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=config['VERSION_RETENTION_DAYS'])
+        keep = config['VERSION_MAX_PER_FILE']
+
+        q = db.session.query(FileVersion.user_id, FileVersion.path).distinct()
+        if user_id is not None:
+            q = q.filter(FileVersion.user_id == int(user_id))
+        if path is not None:
+            q = q.filter(FileVersion.path == path)
+
+        removed = 0
+        for uid, version_path in q.all():
+            versions = FileVersion.query.filter_by(user_id=uid, path=version_path).order_by(
+                FileVersion.created_at.desc(), FileVersion.id.desc()
+            ).all()
+            expired = [v for i, v in enumerate(versions)
+                       if v.status == 'stored' and (i >= keep or v.created_at < cutoff)]
+            if expired:
+                VersionService._delete_versions(expired)
+                removed += len(expired)
+
+        if removed:
+            VersionService.collect_garbage()
+        return removed
+
+    @staticmethod
+    def collect_garbage():
+        """Apaga do store os chunks sem referências; retorna (chunks, bytes) liberados.
+
+        O arquivo vai primeiro para uma lápide e só é apagado se, depois disso, o
+        chunk continuar sem linha; se outra versão o recriou nesse meio tempo, a
+        lápide volta para o lugar (o conteúdo é o mesmo, endereçado pelo hash).
+        """
+        freed_chunks = freed_bytes = 0
+        orphans = Chunk.query.filter(Chunk.refcount <= 0).all()
+        for chunk in orphans:
+            digest, size = chunk.hash, chunk.size
+            # Só apaga o arquivo se a linha ainda estava sem referência ao remover
+            deleted = db.session.execute(
+                delete(Chunk).where(Chunk.hash == digest, Chunk.refcount <= 0)
+            ).rowcount
+            db.session.commit()
+            if not deleted:
+                continue
+            chunk_path = VersionService.get_chunk_path(digest)
+            tombstone = chunk_path.with_name(f"{digest}.{uuid.uuid4().hex[:8]}.dead")
+            try:
+                chunk_path.rename(tombstone)
+            except FileNotFoundError:
+                continue
+            db.session.commit()  # nova transação: enxerga linhas confirmadas depois do rename
+            if db.session.get(Chunk, digest) is not None:
+                tombstone.replace(chunk_path)
+                continue
+            tombstone.unlink()
+            freed_chunks += 1
+            freed_bytes += size
+        return freed_chunks, freed_bytes
+
+    @staticmethod
+    def to_dict(version):
+        return {
+            'id': version.id,
+            'path': version.path,
+            'size': version.size,
+            'status': version.status,
+            'created_at': version.created_at.isoformat()
+        }
+
+
+@click.command('versions-prune')
+@click.option('--user-id', type=int, default=None, help='Aplica a retenção apenas a este usuário')
+@with_appcontext
+def prune_versions_command(user_id):
+    """Aplica a retenção de versões e apaga chunks sem referência."""
+    removed = VersionService.prune(user_id)
+    freed_chunks, freed_bytes = VersionService.collect_garbage()
+    print(f"🧹 {removed} versões removidas, {freed_chunks} chunks apagados ({freed_bytes} bytes)")
@@ -0,0 +1,353 @@
+import ctypes
+import ctypes.util
+import datetime
+import errno
+import os
+import re
+import select
+import struct
+import sys
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.extensions import db
+from app.models import FileEntry, User
+from app.services import storage_events
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_USER_DIR_RE = re.compile(r'^user_(\d+)$')
+
+
+class Inotify:
+    """Wrapper mínimo (ctypes) sobre a API inotify do Linux"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self, timeout):
+        """Lê os eventos disponíveis: lista de (wd, mask, cookie, name)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buf = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class StorageWatcher:
+    """Observa STORAGE_PATH com inotify e reconcilia o índice com o disco.
+
+    Eventos de um mesmo caminho são agrupados e só processados após
+    WATCHER_DEBOUNCE_SECONDS sem novas mudanças (ou WATCHER_MAX_DELAY_SECONDS).
+    Cada caminho sujo é comparado com o índice de arquivos e só as diferenças
+    viram eventos de storage, então mudanças feitas pela própria API (que já
+    atualizaram o índice) não são duplicadas. Se a fila do kernel estourar,
+    todas as pastas de usuário são reconciliadas comparando o stat de cada
+    arquivo com o índice (o mtime da pasta não muda quando um arquivo é
+    reescrito no lugar), começando pelas que estavam recebendo eventos.
+    """
+
+    def __init__(self, storage_path, debounce, max_delay):
+        self.storage_path = storage_path.resolve()
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.inotify = Inotify()
+        self.watches = {}
+        self.pending = {}  # caminho -> (primeiro evento, último evento)
+        self.overflowed = False
+        self.active_roots = set()  # pastas de usuário com eventos desde o último flush (vão primeiro no overflow)
+        self._known_users = {}
+
+    # --- watches ---------------------------------------------------------
+
+    def _is_ignored(self, path):
+        relative = os.path.relpath(path, self.storage_path)
+        return relative != '.' and relative.split(os.sep)[0].startswith('.')
+
+    def watch_tree(self, root):
+        """Adiciona watches na pasta e em todas as subpastas (ignorando .system/.trash)"""
+        stack = [str(root)]
+        while stack:
+            current = stack.pop()
+            if self._is_ignored(current):
+                continue
+            try:
+                wd = self.inotify.add_watch(current)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    print("⚠️ Limite de watches do inotify atingido (fs.inotify.max_user_watches)")
+                    return
+                continue
+            self.watches[wd] = current
+            try:
+                with os.scandir(current) as it:
+                    stack.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+            except FileNotFoundError:
+                continue
+
+    # --- eventos -----------------------------------------------------------
+
+    def _user_root(self, path):
+        """Pasta do usuário (STORAGE_PATH/user_N) que contém o caminho, ou None"""
+        relative = os.path.relpath(path, self.storage_path)
+        if relative == '.' or relative.startswith('..'):
+            return None
+        return os.path.join(self.storage_path, relative.split(os.sep)[0])
+
+    def _mark_dirty(self, path):
+        root = self._user_root(path)
+        if root is not None:
+            self.active_roots.add(root)
+        now = time.monotonic()
+        first, _ = self.pending.get(path, (now, now))
+        self.pending[path] = (first, now)
+
+    def handle_events(self, events):
+        for wd, mask, cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            base = self.watches.get(wd)
+            if base is None:
+                continue
+            path = os.path.join(base, name) if name else base
+            if self._is_ignored(path):
+                continue
+
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.watch_tree(path)
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self._mark_dirty(base)
+            else:
+                self._mark_dirty(path)
+
+    def due_paths(self):
+        now = time.monotonic()
+        due = [path for path, (first, last) in self.pending.items()
+               if now - last >= self.debounce or now - first >= self.max_delay]
+        for path in due:
+            del self.pending[path]
+        return due
+
+    def next_timeout(self):
+        if not self.pending:
+            return self.max_delay
+        now = time.monotonic()
+        return max(0.05, min(
+            min(last + self.debounce, first + self.max_delay) - now
+            for first, last in self.pending.values()
+        ))
+
+    # --- reconciliação -------------------------------------------------------
+
+    def _locate(self, path):
+        """Converte um caminho absoluto em (user_id, caminho relativo) ou None"""
+        relative = os.path.relpath(path, self.storage_path)
+        if relative == '.' or relative.startswith('..'):
+            return None
+        parts = relative.split(os.sep)
+        match = _USER_DIR_RE.match(parts[0])
+        if not match:
+            return None
+        user_id = int(match.group(1))
+        if user_id not in self._known_users:
+            self._known_users[user_id] = db.session.get(User, user_id) is not None
+        if not self._known_users[user_id]:
+            return None
+        return user_id, '/'.join(parts[1:])
+
+    @staticmethod
+    def _entry_matches(entry, stat):
+        modified = datetime.datetime.fromtimestamp(stat.st_mtime)
+        return (entry.modified_at is not None and entry.stored_size == stat.st_size
+                and abs((entry.modified_at - modified).total_seconds()) < 1)
+
+    def reconcile_path(self, path):
+        """Compara um caminho com o índice e emite eventos só para as diferenças"""
+        located = self._locate(path)
+        if located is None:
+            return 0
+        user_id, relative = located
+
+        if os.path.isdir(path):
+            return self.reconcile_directory(user_id, relative, recursive=True)
+
+        entry = FileEntry.query.filter_by(user_id=user_id, path=relative).first() if relative else None
+        if not os.path.exists(path):
+            if entry is not None:
+                storage_events.emit(storage_events.DELETED, user_id, relative, is_dir=entry.is_dir)
+                return 1
+            return 0
+
+        stat = os.stat(path)
+        if entry is not None and self._entry_matches(entry, stat):
+            return 0
+        if entry is not None and entry.encoding and entry.stored_size == stat.st_size:
+            storage_events.emit(storage_events.CREATED, user_id, relative, size=entry.size, encoding=entry.encoding)
+        else:
+            storage_events.emit(storage_events.CREATED, user_id, relative)
+        return 1
+
+    def reconcile_directory(self, user_id, relative_dir, recursive=False):
+        """Sincroniza os filhos diretos de uma pasta (e subpastas, se recursive)"""
+        user_root = self.storage_path / f"user_{user_id}"
+        directory = user_root / relative_dir if relative_dir else user_root
+        indexed = {entry.name: entry for entry in FileEntry.query.filter_by(user_id=user_id, parent=relative_dir)}
+        changes = 0
+
+        if relative_dir and not FileEntry.query.filter_by(user_id=user_id, path=relative_dir).first():
+            storage_events.emit(storage_events.MKDIR, user_id, relative_dir, is_dir=True)
+            changes += 1
+
+        try:
+            with os.scandir(directory) as it:
+                disk_entries = list(it)
+        except FileNotFoundError:
+            disk_entries = []
+
+        for item in disk_entries:
+            child = f"{relative_dir}/{item.name}" if relative_dir else item.name
+            entry = indexed.pop(item.name, None)
+            if item.is_dir(follow_symlinks=False):
+                if entry is None or recursive:
+                    changes += self.reconcile_directory(user_id, child, recursive=True)
+            elif entry is None or not self._entry_matches(entry, item.stat()):
+                changes += self.reconcile_path(item.path)
+
+        for name, entry in indexed.items():
+            child = f"{relative_dir}/{name}" if relative_dir else name
+            storage_events.emit(storage_events.DELETED, user_id, child, is_dir=entry.is_dir)
+            changes += 1
+        return changes
+
+    def rescan_after_overflow(self):
+        """Após overflow: reconcilia todas as pastas de usuário, arquivo a arquivo.
+
+        O inotify não diz de quem eram os eventos perdidos, então nenhuma pasta
+        pode ficar de fora. As que estavam recebendo eventos vão primeiro; em
+        todas, só tamanho/mtime são comparados com o índice (``_entry_matches``),
+        e apenas as diferenças são relidas.
+        """
+        active = set(self.active_roots)
+        active.update(filter(None, (self._user_root(path) for path in self.pending)))
+        existing = {entry.path for entry in os.scandir(self.storage_path)
+                    if entry.is_dir(follow_symlinks=False) and not self._is_ignored(entry.path)}
+
+        changes = 0
+        for root in sorted(active) + sorted(existing - active):
+            if not os.path.isdir(root):
+                changes += self.reconcile_path(root)
+                continue
+            located = self._locate(root)
+            if located is not None:
+                changes += self.reconcile_directory(located[0], '', recursive=True)
+            # Pastas criadas durante o estouro ainda não observadas
+            self.watch_tree(root)
+        return changes
+
+    def flush(self):
+        changes = 0
+        if self.overflowed:
+            self.overflowed = False
+            print("⚠️ Fila do inotify estourou; reconciliando todas as pastas de usuário")
+            changes += self.rescan_after_overflow()
+        for path in self.due_paths():
+            changes += self.reconcile_path(path)
+        if changes:
+            db.session.commit()
+        if not self.pending:
+            self.active_roots.clear()
+        return changes
+
+    def initial_scan(self):
+        changes = 0
+        for user_dir in self.storage_path.iterdir():
+            if user_dir.is_dir() and _USER_DIR_RE.match(user_dir.name):
+                located = self._locate(str(user_dir))
+                if located is not None:
+                    changes += self.reconcile_directory(located[0], '', recursive=True)
+        return changes
+
+    def run(self, initial_scan=True):
+        self.watch_tree(self.storage_path)
+        print(f"👀 Observando {self.storage_path} ({len(self.watches)} pastas)")
+        if initial_scan:
+            print(f"🔄 Varredura inicial: {self.initial_scan()} mudanças aplicadas")
+        try:
+            while True:
+                events = self.inotify.read_events(self.next_timeout())
+                self.handle_events(events)
+                changes = self.flush()
+                if changes:
+                    print(f"🔄 {changes} mudanças externas sincronizadas")
+                # Libera objetos da sessão para não crescer indefinidamente
+                db.session.remove()
+        finally:
+            self.inotify.close()
+
+
+@click.command('watch-storage')
+@click.option('--initial-scan/--no-initial-scan', default=True,
+              help='Reconciliar toda a árvore antes de começar a observar')
+@with_appcontext
+def watch_storage_command(initial_scan):
+    """Observa o STORAGE_PATH (inotify) e mantém índices sincronizados com o disco."""
+    if not sys.platform.startswith('linux'):
+        raise click.ClickException('O watcher usa inotify e só está disponível no Linux')
+
+    config = current_app.config
+    watcher = StorageWatcher(
+        config['STORAGE_PATH'], config['WATCHER_DEBOUNCE_SECONDS'], config['WATCHER_MAX_DELAY_SECONDS']
+    )
+    watcher.run(initial_scan=initial_scan)
@@ -0,0 +1,244 @@
+"""Benchmark reprodutível dos caminhos críticos de storage e autenticação.
+
+Sobe a aplicação contra SQLite e um STORAGE_PATH temporário, gera árvores
+sintéticas de arquivos para um usuário e mede upload, listagem, storage-info,
+download, move, delete, login e registro. O resultado (vazão e latências
+p50/p99) é gravado em JSON para comparação entre commits.
+
+Uso:
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --shapes wide,deep
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+
+UPLOAD_PAYLOAD = os.urandom(4096)
+SYNTHETIC_FILE_PAYLOAD = b"x" * 64
+
+
+def percentile(samples, pct):
+    """Percentil por interpolação linear (samples já ordenado)"""
+    if not samples:
+        return 0.0
+    k = (len(samples) - 1) * (pct / 100)
+    lower = int(k)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (k - lower)
+
+
+def summarize(durations):
+    """Resume uma lista de durações (segundos) em vazão e latências (ms)"""
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'total_s': round(total, 6),
+        'throughput_ops_s': round(len(ordered) / total, 2) if total > 0 else None,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def build_tree(user_root, n_files, shape):
+    """Gera uma árvore sintética com n_files arquivos.
+
+    wide: poucas pastas no primeiro nível com muitos arquivos cada.
+    deep: uma cadeia de pastas aninhadas com os arquivos distribuídos nos níveis.
+    Retorna o caminho relativo da pasta mais "pesada" para medir listagens.
+    """
+    if shape == 'wide':
+        folders = max(1, n_files // 1000)
+        per_folder = n_files // folders
+        for i in range(folders):
+            folder = user_root / f"folder_{i:05d}"
+            folder.mkdir(parents=True, exist_ok=True)
+            count = per_folder if i < folders - 1 else n_files - per_folder * (folders - 1)
+            for j in range(count):
+                (folder / f"file_{j:07d}.txt").write_bytes(SYNTHETIC_FILE_PAYLOAD)
+        return "folder_00000"
+
+    depth = 32
+    per_level = max(1, n_files // depth)
+    current = user_root
+    parts = []
+    written = 0
+    for level in range(depth):
+        parts.append(f"level_{level:02d}")
+        current = current / parts[-1]
+        current.mkdir(parents=True, exist_ok=True)
+        count = per_level if level < depth - 1 else n_files - written
+        for j in range(count):
+            (current / f"file_{j:07d}.txt").write_bytes(SYNTHETIC_FILE_PAYLOAD)
+        written += count
+    return "/".join(parts)
+
+
+def timed(fn, iterations, setup=None):
+    """Executa fn `iterations` vezes medindo apenas a chamada (setup fica fora)"""
+    durations = []
+    for i in range(iterations):
+        arg = setup(i) if setup else i
+        start = time.perf_counter()
+        response = fn(arg)
+        durations.append(time.perf_counter() - start)
+        # Fecha a resposta como um servidor WSGI faria (libera slots de transferência)
+        response.close()
+        if response.status_code >= 400:
+            raise RuntimeError(f"Falha no benchmark ({response.status_code}): {response.get_data(as_text=True)}")
+    return summarize(durations)
+
+
+def make_config(workdir):
+    class BenchmarkConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{workdir / 'bench.db'}"
+        STORAGE_PATH = workdir / 'storage'
+        MAX_STORAGE_SIZE = 1024 * 1024 * 1024 * 1024
+        MAX_USER_STORAGE_SIZE = 1024 * 1024 * 1024 * 1024
+
+    return BenchmarkConfig
+
+
+def run_scenario(n_files, shape, iterations):
+    """Executa todas as medições para um tamanho e formato de árvore"""
+    workdir = Path(tempfile.mkdtemp(prefix='docsstorage-bench-'))
+    try:
+        app = create_app(make_config(workdir))
+        client = app.test_client()
+
+        resp = client.post('/api/auth/register', json={
+            'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'
+        })
+        user_id = resp.get_json()['user']['id']
+        headers = {'Authorization': f"Bearer {resp.get_json()['token']}"}
+
+        user_root = app.config['STORAGE_PATH'] / f"user_{user_id}"
+        user_root.mkdir(parents=True, exist_ok=True)
+        build_start = time.perf_counter()
+        heavy_path = build_tree(user_root, n_files, shape)
+        build_seconds = time.perf_counter() - build_start
+
+        uploaded = []
+
+        def upload(i, prefix='upload'):
+            data = {'file': (io.BytesIO(UPLOAD_PAYLOAD), f"{prefix}_{i:06d}.bin")}
+            response = client.post('/api/files/upload', headers=headers, data=data,
+                                   content_type='multipart/form-data')
+            if response.status_code < 400:
+                uploaded.append(response.get_json()['file']['filename'])
+            response.close()
+            return response
+
+        results = {}
+        results['upload'] = timed(upload, iterations)
+        results['list_root'] = timed(
+            lambda _: client.get('/api/files/', headers=headers), iterations)
+        results['list_heavy_folder'] = timed(
+            lambda _: client.get('/api/files/', headers=headers, query_string={'path': heavy_path}), iterations)
+        results['storage_info'] = timed(
+            lambda _: client.get('/api/files/storage-info', headers=headers), iterations)
+        results['download'] = timed(
+            lambda i: client.get(f"/api/files/download/{uploaded[i % len(uploaded)]}", headers=headers),
+            iterations)
+
+        def move_setup(i):
+            upload(i, prefix='move')
+            return uploaded.pop()
+
+        results['move'] = timed(
+            lambda name: client.post('/api/files/move', headers=headers,
+                                     json={'filename': name, 'target_path': 'bench_moved'}),
+            iterations, setup=move_setup)
+
+        def delete_setup(i):
+            upload(i, prefix='delete')
+            return uploaded.pop()
+
+        results['delete'] = timed(
+            lambda name: client.delete(f"/api/files/delete/{name}", headers=headers),
+            iterations, setup=delete_setup)
+
+        results['login'] = timed(
+            lambda _: client.post('/api/auth/login', json={
+                'email': 'bench@example.com', 'password': 'bench-password'}),
+            iterations)
+        results['register'] = timed(
+            lambda i: client.post('/api/auth/register', json={
+                'username': f"bench_{n_files}_{shape}_{i}",
+                'email': f"bench_{i}@example.com",
+                'password': 'bench-password'}),
+            iterations)
+
+        return {
+            'files': n_files,
+            'shape': shape,
+            'iterations': iterations,
+            'tree_build_s': round(build_seconds, 3),
+            'operations': results,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos críticos do DocsStorage')
+    parser.add_argument('--sizes', default='1000',
+                        help='Quantidade de arquivos por cenário, separados por vírgula (ex: 1000,100000,1000000)')
+    parser.add_argument('--shapes', default='wide,deep', help='Formatos de árvore: wide, deep')
+    parser.add_argument('--iterations', type=int, default=50, help='Repetições por operação')
+    parser.add_argument('--output', default='bench_results.json', help='Arquivo JSON de saída')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    shapes = [s.strip() for s in args.shapes.split(',') if s.strip()]
+
+    scenarios = []
+    for n_files in sizes:
+        for shape in shapes:
+            print(f"⏱️ Cenário: {n_files} arquivos ({shape})", file=sys.stderr)
+            # Os serviços logam via print; silenciamos para não distorcer a saída
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                scenarios.append(run_scenario(n_files, shape, args.iterations))
+
+    report = {
+        'git_revision': git_revision(),
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scenarios': scenarios,
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"✅ Resultados gravados em {args.output}", file=sys.stderr)
+    return report
+
+
+if __name__ == '__main__':
+    main()
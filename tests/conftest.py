@@ -0,0 +1,65 @@
+import pytest
+from app import create_app
+from app.config import Config
+from app.services.job_service import JobService
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Cria a aplicação com um banco e um STORAGE_PATH temporários; kwargs sobrescrevem a config"""
+    def factory(**overrides):
+        attrs = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'STORAGE_PATH': tmp_path / 'storage',
+            'PASSWORD_HASH_WORKERS': 0,  # hash na própria thread
+            'SEARCH_ENABLED': False,
+        }
+        attrs.update(overrides)
+        return create_app(type('TestConfig', (Config,), attrs))
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, username='user'):
+    """Cria um usuário e retorna (id, headers com o token)"""
+    response = client.post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': 'secret'
+    })
+    data = response.get_json()
+    return data['user']['id'], {'Authorization': f"Bearer {data['token']}"}
+
+
+@pytest.fixture
+def auth(client):
+    return register(client)
+
+
+class DeferredExecutor:
+    """Guarda os jobs submetidos para rodá-los quando o teste quiser"""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn):
+        self.pending.append(fn)
+
+    def run_all(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+@pytest.fixture
+def deferred_jobs(monkeypatch):
+    executor = DeferredExecutor()
+    monkeypatch.setattr(JobService, '_get_executor', staticmethod(lambda: executor))
+    return executor
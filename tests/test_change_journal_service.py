@@ -0,0 +1,36 @@
+import threading
+from tests.conftest import register
+
+WRITERS = 6
+FILES_PER_WRITER = 10
+
+
+def _cursors(client, headers):
+    response = client.get('/api/files/changes', headers=headers, query_string={'since': 0, 'limit': 1000})
+    return [change['cursor'] for change in response.get_json()['changes']]
+
+
+def test_concurrent_writers_get_contiguous_cursors_per_user(app, client):
+    users = [register(client, username) for username in ('alice', 'bob')]
+    errors = []
+
+    def writer(headers, index):
+        writer_client = app.test_client()
+        for n in range(FILES_PER_WRITER):
+            response = writer_client.post('/api/files/create', headers=headers,
+                                          json={'name': f'w{index}_{n}.txt'})
+            if response.status_code != 201:
+                errors.append(response.get_json())
+
+    threads = [threading.Thread(target=writer, args=(headers, index))
+               for _, headers in users for index in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # Cada usuário tem a própria sequência: 1..N, sem buracos nem repetições
+    expected = list(range(1, WRITERS * FILES_PER_WRITER + 1))
+    for _, headers in users:
+        assert _cursors(client, headers) == expected
@@ -0,0 +1,68 @@
+from app.models import FileEntry, Job
+
+
+def _paths(user_id):
+    return sorted(entry.path for entry in FileEntry.query.filter_by(user_id=user_id))
+
+
+def test_delete_folder_updates_index_before_job_runs(app, client, auth, deferred_jobs):
+    user_id, headers = auth
+    client.post('/api/files/mkdir', headers=headers, json={'name': 'proj'})
+    client.post('/api/files/create', headers=headers, json={'name': 'old.txt', 'path': 'proj'})
+
+    response = client.post('/api/files/delete-folder', headers=headers, json={'path': 'proj'})
+    assert response.status_code == 202
+    with app.app_context():
+        assert _paths(user_id) == []
+
+    # O usuário recria o caminho antes do job apagar a lixeira
+    client.post('/api/files/mkdir', headers=headers, json={'name': 'proj'})
+    client.post('/api/files/create', headers=headers, json={'name': 'new.txt', 'path': 'proj'})
+    deferred_jobs.run_all()
+
+    with app.app_context():
+        assert _paths(user_id) == ['proj', 'proj/new.txt']
+        assert Job.query.one().status == 'completed'
+    user_root = app.config['STORAGE_PATH'] / f'user_{user_id}'
+    assert (user_root / 'proj' / 'new.txt').is_file()
+    assert not (user_root / 'proj' / 'old.txt').exists()
+
+    changes = client.get('/api/files/changes', headers=headers, query_string={'since': 0}).get_json()['changes']
+    assert [(c['action'], c['path']) for c in changes] == [
+        ('mkdir', 'proj'), ('created', 'proj/old.txt'), ('deleted', 'proj'),
+        ('mkdir', 'proj'), ('created', 'proj/new.txt'),
+    ]
+
+
+def test_purge_trash_reclaims_jobs_of_dead_processes(app, auth):
+    import datetime
+    import socket
+    import subprocess
+    import sys
+    from app.extensions import db
+    from app.services.folder_service import FolderService
+
+    user_id, _ = auth
+    dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                          capture_output=True, text=True).stdout.strip()
+    with app.app_context():
+        for job_id, owner in (('a' * 32, f"{socket.gethostname()}:{dead}"), ('b' * 32, None)):
+            db.session.add(Job(id=job_id, user_id=user_id, kind='delete_folder', status='running',
+                               owner=owner, created_at=datetime.datetime.now()))
+            (FolderService.get_trash_directory() / job_id / 'sub').mkdir(parents=True)
+        db.session.commit()
+
+        assert FolderService.purge_trash() == 2
+        assert list(FolderService.get_trash_directory().iterdir()) == []
+        assert {job.status for job in Job.query} == {'failed'}
+
+
+def test_active_job_keeps_its_trash(app, client, auth, deferred_jobs):
+    from app.services.folder_service import FolderService
+
+    _, headers = auth
+    client.post('/api/files/mkdir', headers=headers, json={'name': 'proj'})
+    client.post('/api/files/delete-folder', headers=headers, json={'path': 'proj'})
+    with app.app_context():
+        assert FolderService.purge_trash() == 0
+        assert Job.query.one().status == 'pending'
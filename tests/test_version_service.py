@@ -0,0 +1,82 @@
+import io
+import pytest
+from app.services.version_service import VersionService
+from tests.conftest import register
+
+
+@pytest.fixture(autouse=True)
+def pending_versions(monkeypatch):
+    # As versões ficam pendentes (sem chunking em segundo plano) durante o teste
+    monkeypatch.setattr(VersionService, 'schedule_store', staticmethod(lambda version_id: None))
+
+
+def _setup(make_app, **config):
+    app = make_app(MAX_USER_STORAGE_SIZE=1000, **config)
+    client = app.test_client()
+    user_id, headers = register(client)
+    return app, client, user_id, headers
+
+
+def _upload(client, headers, data, name='notes.txt', path=None):
+    form = {'file': (io.BytesIO(data), name)}
+    if path:
+        form['path'] = path
+    return client.post('/api/files/upload', headers=headers, data=form, content_type='multipart/form-data')
+
+
+def _read(app, user_id, filename):
+    return (app.config['STORAGE_PATH'] / f'user_{user_id}' / filename).read_bytes()
+
+
+def test_replace_rejects_content_over_quota(make_app):
+    app, client, user_id, headers = _setup(make_app)
+    filename = _upload(client, headers, b'a' * 600).get_json()['file']['filename']
+
+    response = _upload(client, headers, b'b' * 1200, path=filename)
+    assert response.status_code == 413
+    assert _read(app, user_id, filename) == b'a' * 600
+
+    # Só a diferença para o conteúdo atual conta: 600 -> 900 cabe em 1000
+    assert _upload(client, headers, b'c' * 900, path=filename).status_code == 201
+    assert _read(app, user_id, filename) == b'c' * 900
+
+
+def test_replace_measures_compressed_content_in_stored_bytes(make_app):
+    app, client, user_id, headers = _setup(make_app, COMPRESSION_ENABLED=True, COMPRESSION_MIN_SIZE=100)
+    filename = _upload(client, headers, b'a' * 600).get_json()['file']['filename']
+
+    # 5000 bytes lógicos, poucos bytes em disco: cabe na contagem física
+    response = _upload(client, headers, b'b' * 5000, path=filename)
+    assert response.status_code == 201
+    assert response.get_json()['file']['stored_size'] < 1000
+
+
+def test_replace_measures_compressed_content_in_logical_bytes(make_app):
+    app, client, user_id, headers = _setup(make_app, COMPRESSION_ENABLED=True, COMPRESSION_MIN_SIZE=100,
+                                           QUOTA_ACCOUNTING='logical')
+    filename = _upload(client, headers, b'a' * 600).get_json()['file']['filename']
+
+    assert _upload(client, headers, b'b' * 5000, path=filename).status_code == 413
+
+
+def test_restore_rejects_version_over_quota(make_app):
+    app, client, user_id, headers = _setup(make_app)
+    filename = _upload(client, headers, b'a' * 900).get_json()['file']['filename']
+    version = _upload(client, headers, b'b' * 100, path=filename).get_json()['file']['previous_version']
+    _upload(client, headers, b'c' * 800, name='other.txt')
+
+    # Voltar aos 900 bytes somaria 1700 de 1000
+    response = client.post(f"/api/files/versions/{version['id']}/restore", headers=headers)
+    assert response.status_code == 413
+    assert _read(app, user_id, filename) == b'b' * 100
+    assert list((app.config['STORAGE_PATH'] / '.system' / 'uploads').iterdir()) == []
+
+
+def test_restore_within_quota(make_app):
+    app, client, user_id, headers = _setup(make_app)
+    filename = _upload(client, headers, b'a' * 900).get_json()['file']['filename']
+    version = _upload(client, headers, b'b' * 100, path=filename).get_json()['file']['previous_version']
+
+    response = client.post(f"/api/files/versions/{version['id']}/restore", headers=headers)
+    assert response.status_code == 200
+    assert _read(app, user_id, filename) == b'a' * 900